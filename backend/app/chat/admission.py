@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+import psutil
+
+from app.chat.render_pool import RenderWorkerPool
+
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """Decides whether this box can take another render, from measured CPU and memory.
+
+    The task semaphore stays the hard cap. Below it, a task is only admitted while
+    system CPU stays under `max_cpu_percent` and there is room for one more render
+    (the recent peak RSS of a render worker, ffmpeg children included) on top of
+    `min_free_memory_bytes`. Tasks admitted since the last sample are counted
+    against both, so a burst can't overshoot before the numbers catch up.
+    """
+
+    def __init__(
+        self,
+        pool: RenderWorkerPool,
+        max_cpu_percent: float = 85,
+        min_free_memory_bytes: int = 1024 * 1024 * 1024,
+        render_memory_bytes: int = 1024 * 1024 * 1024,
+        sample_interval: float = 2,
+    ):
+        self.pool = pool
+        self.max_cpu_percent = max_cpu_percent
+        self.min_free_memory_bytes = min_free_memory_bytes
+        self.sample_interval = sample_interval
+
+        # Decaying max of the RSS a busy worker reached, seeded with a guess until renders are measured
+        self.render_memory_bytes = render_memory_bytes
+        self.cpu_count = psutil.cpu_count() or 1
+
+        self.cpu_percent = 0.0
+        self.memory_available = psutil.virtual_memory().available
+        self._sampled_at = 0.0
+        self._admitted_since_sample = 0
+
+        psutil.cpu_percent(interval=None)  # First call only sets the baseline
+
+    def sample(self) -> None:
+        self.cpu_percent = psutil.cpu_percent(interval=None)
+        self.memory_available = psutil.virtual_memory().available
+
+        busy = [worker["rss"] for worker in self.pool.stats() if worker["busy"]]
+        self.render_memory_bytes = max([int(self.render_memory_bytes * 0.99), *busy])
+
+        self._sampled_at = time.monotonic()
+        self._admitted_since_sample = 0
+
+    def can_admit(self, running: int) -> bool:
+        if time.monotonic() - self._sampled_at >= self.sample_interval:
+            self.sample()
+
+        # Never starve the box: one render always runs
+        if running == 0:
+            return True
+
+        pending = self._admitted_since_sample + 1
+        projected_cpu = self.cpu_percent + self._admitted_since_sample * 100 / self.cpu_count
+        projected_memory = self.memory_available - pending * self.render_memory_bytes
+
+        return projected_cpu < self.max_cpu_percent and projected_memory >= self.min_free_memory_bytes
+
+    async def admit(self, running: Callable[[], int]) -> None:
+        """Waits until another render fits. `running` counts the renders in progress, it is re-read while waiting."""
+        throttled_at: Optional[float] = None
+
+        while not self.can_admit(running()):
+            if throttled_at is None:
+                throttled_at = time.monotonic()
+                logger.info(
+                    f"Holding back new renders: {self.cpu_percent:.0f}% CPU, "
+                    f"{self.memory_available // (1024 * 1024)} MB free, "
+                    f"{self.render_memory_bytes // (1024 * 1024)} MB per render"
+                )
+
+            await asyncio.sleep(self.sample_interval)
+
+        if throttled_at is not None:
+            logger.info(f"Admitted a render after {time.monotonic() - throttled_at:.1f}s")
+
+        self._admitted_since_sample += 1
+
+    def stats(self) -> dict:
+        """Box-wide aggregates only, no per-process details."""
+        memory = psutil.virtual_memory()
+        workers = self.pool.stats()
+
+        return {
+            "cpu_count": self.cpu_count,
+            "cpu_percent": self.cpu_percent,
+            "load_average": os.getloadavg(),
+            "memory_total": memory.total,
+            "memory_available": memory.available,
+            "render_memory_bytes": self.render_memory_bytes,
+            "max_cpu_percent": self.max_cpu_percent,
+            "min_free_memory_bytes": self.min_free_memory_bytes,
+            "workers": len(workers),
+            "busy_workers": sum(1 for worker in workers if worker["busy"]),
+            "workers_rss": sum(worker["rss"] for worker in workers),
+        }
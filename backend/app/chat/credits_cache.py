@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Credits
+
+
+class CreditsCache:
+    """Read-through cache of credit balances, for /credits and the pre-flight checks.
+
+    Deductions stay in SQL and write the new balance back here. An entry never
+    outlives the next daily refresh, so a cached balance is at worst `ttl` seconds
+    stale and never misses a refresh.
+    """
+
+    KEY = "manim:credits:{user_id}"
+
+    def __init__(self, redis_client: redis.Redis, ttl: int = 60):
+        self.redis = redis_client
+        self.ttl = ttl
+
+    async def get(self, user_id: str) -> Optional[Tuple[int, datetime]]:
+        entry = await self.redis.hgetall(self.KEY.format(user_id=user_id))
+
+        if not entry or "amount" not in entry:
+            return None
+
+        return int(entry["amount"]), datetime.fromisoformat(entry["refreshed_at"])
+
+    async def put(self, user_id: str, amount: int, refreshed_at: datetime) -> None:
+        cache_key = self.KEY.format(user_id=user_id)
+        until_refresh = (refreshed_at + Credits.REFRESH_INTERVAL - datetime.now(timezone.utc)).total_seconds()
+        ttl = int(min(self.ttl, until_refresh))
+
+        if ttl <= 0:
+            await self.redis.delete(cache_key)
+            return
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(cache_key, mapping={"amount": amount, "refreshed_at": refreshed_at.isoformat()})
+            pipe.expire(cache_key, ttl)
+            await pipe.execute()
+
+    async def balance(self, db: AsyncSession, user_id: str) -> Optional[Tuple[int, datetime]]:
+        """(amount, refreshed_at) from Redis, or from the database on a miss."""
+        if cached := await self.get(user_id):
+            return cached
+
+        current = await Credits.current(db, user_id)
+        if current:
+            await self.put(user_id, *current)
+
+        return current
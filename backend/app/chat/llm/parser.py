@@ -1,3 +1,4 @@
+import hashlib
 import re
 import os
 from typing import Dict, List, Optional, TypedDict
@@ -286,19 +287,144 @@ class MarkdownPythonParser:
         
         return info
 
+@dataclass
+class StreamEvent:
+    """Event emitted by StreamingPythonParser. kind is one of text, code_start, code_chunk, code_end."""
+    kind: str
+    text: str = ""
+
+
+class StreamingPythonParser:
+    """Incremental version of MarkdownPythonParser for LLM output that arrives in chunks.
+
+    Feed chunks as they stream in and get text/code events back. Fences split across
+    chunk boundaries are held back until they can be told apart from plain backticks.
+    Completed ```py blocks are collected in `code_blocks`, cleaned the same way as
+    MarkdownPythonParser does.
+    """
+
+    FENCE = "```"
+
+    TEXT = "text"
+    INFO = "info"
+    CODE = "code"
+    OTHER = "other"
+
+    def __init__(self):
+        self.state = self.TEXT
+        self.code_blocks: List[str] = []
+
+        self._buffer = ""
+        self._info = ""
+        self._code: List[str] = []
+        self._cleaner = MarkdownPythonParser()
+
+    def feed(self, chunk: str) -> List[StreamEvent]:
+        self._buffer += chunk
+        events: List[StreamEvent] = []
+
+        while self._buffer:
+            if self.state == self.INFO:
+                newline = self._buffer.find("\n")
+                if newline == -1:
+                    self._info += self._buffer
+                    self._buffer = ""
+                    break
+
+                self._info += self._buffer[:newline]
+                self._buffer = self._buffer[newline + 1:]
+
+                if self._info.strip().lower().startswith("py"):
+                    self.state = self.CODE
+                    self._code = []
+                    events.append(StreamEvent("code_start", self._info.strip()))
+                else:
+                    self.state = self.OTHER
+                    events.append(StreamEvent("text", self.FENCE + self._info + "\n"))
+                continue
+
+            fence = self._buffer.find(self.FENCE)
+
+            if fence == -1:
+                # Hold back trailing backticks, they might be the start of a fence
+                keep = len(self._buffer) - len(self._buffer.rstrip("`"))
+                keep = min(keep, len(self.FENCE) - 1)
+                emit, self._buffer = self._buffer[:len(self._buffer) - keep], self._buffer[len(self._buffer) - keep:]
+
+                if emit:
+                    events.append(self._content_event(emit))
+                break
+
+            before, self._buffer = self._buffer[:fence], self._buffer[fence + len(self.FENCE):]
+            if before:
+                events.append(self._content_event(before))
+
+            if self.state == self.TEXT:
+                self.state = self.INFO
+                self._info = ""
+            elif self.state == self.CODE:
+                self.state = self.TEXT
+                self.code_blocks.append(self._cleaner._clean_content("".join(self._code)))
+                events.append(StreamEvent("code_end"))
+            else:
+                self.state = self.TEXT
+                events.append(StreamEvent("text", self.FENCE))
+
+        return events
+
+    def close(self) -> List[StreamEvent]:
+        """Flushes what's left. An unterminated code block is not a code block, same as the regex."""
+        events: List[StreamEvent] = []
+        rest = self._buffer
+
+        if self.state == self.INFO:
+            rest = self.FENCE + self._info + rest
+        elif self.state == self.CODE:
+            rest = self.FENCE + self._info + "\n" + "".join(self._code) + rest
+
+        if rest:
+            events.append(StreamEvent("text", rest))
+
+        self.state = self.TEXT
+        self._buffer = ""
+        self._code = []
+        return events
+
+    def _content_event(self, text: str) -> StreamEvent:
+        if self.state == self.CODE:
+            self._code.append(text)
+            return StreamEvent("code_chunk", text)
+
+        return StreamEvent("text", text)
+
+
 class SimpleParserOutput(TypedDict):
     message: str
     code: str
+    # code without the fence's language tag line
+    code_body: str
     
 def simple_parser(output: str) -> SimpleParserOutput:
-    message = output.split("```")[0].strip()
-    code = output.split("```")[1].strip() if output.split("```")[1:] else ""
+    parts = output.split("```", 2)
+    message = parts[0].strip()
+    code = parts[1].strip() if len(parts) > 1 else ""
+
+    # Everything up to the first newline after the fence is its language tag
+    tag, newline, body = parts[1].partition("\n") if len(parts) > 1 else ("", "", "")
 
     return SimpleParserOutput(
         message=message,
-        code=code
+        code=code,
+        code_body=(body if newline else tag).strip()
     )
 
+def code_hash(code_body: str) -> Optional[str]:
+    """sha256 of simple_parser's code_body, stored with the message to find repeated code.
+
+    code_body leaves out the fence's language tag, so the same program fenced as py, python or bare hashes the same.
+    """
+    return hashlib.sha256(code_body.encode()).hexdigest() if code_body else None
+
 # Example usage and testing
 def main():
     """Example usage of the MarkdownPythonParser."""
@@ -0,0 +1,143 @@
+import ast
+import asyncio
+import builtins
+from functools import lru_cache
+import json
+import logging
+import subprocess
+import sys
+from typing import List, Optional
+
+from app.chat.render_split import is_main_guard
+from app.config import config
+
+
+logger = logging.getLogger(__name__)
+
+# The prompt only allows manim and numpy; the rest is harmless stdlib LLMs reach for anyway
+ALLOWED_IMPORTS = {
+    "manim", "numpy",
+    "__future__", "math", "random", "typing", "itertools", "functools", "collections", "dataclasses", "enum",
+    *filter(None, config.get('MANIM_EXTRA_ALLOWED_IMPORTS', '').split(',')),
+}
+
+EXPORTS_SCRIPT = """
+import json, inspect
+import manim, numpy
+print(json.dumps({
+    "manim": [name for name in dir(manim) if not name.startswith("_")],
+    "numpy": [name for name in dir(numpy) if not name.startswith("_")],
+    "scenes": [name for name, obj in vars(manim).items() if inspect.isclass(obj) and issubclass(obj, manim.Scene)],
+}))
+"""
+
+
+@lru_cache(maxsize=1)
+def installed_exports() -> Optional[dict]:
+    """Names exported by the installed manim and numpy.
+
+    Read in a throwaway interpreter so the web process never pays for importing manim.
+    None if they aren't importable here, in which case symbol checks are skipped.
+    """
+    try:
+        result = subprocess.run([sys.executable, "-c", EXPORTS_SCRIPT], capture_output=True, text=True, timeout=120)
+        exports = json.loads(result.stdout)
+    except Exception as e:
+        logger.warning(f"Could not read manim exports, skipping symbol checks: {str(e)}")
+        return None
+
+    return {key: set(names) for key, names in exports.items()}
+
+
+def _bound_names(tree: ast.Module) -> set[str]:
+    """Every name the code binds anywhere. Scope-insensitive, which is fine for spotting typos and made-up helpers."""
+    names: set[str] = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, ast.MatchAs) and node.name:
+            names.add(node.name)
+
+    return names
+
+
+def check_manim_code(manim_code: str, exports: Optional[dict] = None) -> List[str]:
+    """Static checks for generated scene code. Returns a list of problems, empty if it looks renderable."""
+    try:
+        tree = ast.parse(manim_code, filename="main.py")
+        compile(tree, "main.py", "exec")
+    except SyntaxError as e:
+        return [f"Syntax error on line {e.lineno}: {e.msg}"]
+
+    errors: List[str] = []
+    star_imports: set[str] = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [node.module or ""]
+            if any(alias.name == "*" for alias in node.names):
+                star_imports.add(node.module or "")
+        else:
+            continue
+
+        for module in modules:
+            if module.split(".")[0] not in ALLOWED_IMPORTS:
+                errors.append(f"Import of '{module}' is not allowed")
+
+    scene_names = exports["scenes"] if exports else None
+    scene_classes = [
+        node for node in tree.body
+        if isinstance(node, ast.ClassDef) and any(
+            isinstance(base, ast.Name) and (base.id in scene_names if scene_names else base.id.endswith("Scene"))
+            for base in node.bases
+        )
+    ]
+    if not scene_classes:
+        errors.append("No Scene subclass found")
+
+    main_blocks = [node for node in tree.body if is_main_guard(node)]
+    renders = [
+        node for block in main_blocks for node in ast.walk(block)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "render"
+    ]
+    if not renders:
+        errors.append("No `if __name__ == \"__main__\":` block that renders a scene")
+
+    if exports:
+        known = _bound_names(tree) | set(dir(builtins)) | {"__name__", "__file__"}
+        if "manim" in star_imports:
+            known |= exports["manim"]
+        if "numpy" in star_imports:
+            known |= exports["numpy"]
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom) and node.module == "manim":
+                for alias in node.names:
+                    if alias.name != "*" and alias.name not in exports["manim"]:
+                        errors.append(f"'{alias.name}' is not exported by the installed manim")
+
+        unknown = sorted({
+            node.id for node in ast.walk(tree)
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in known
+        })
+        errors.extend(f"Name '{name}' is not defined" for name in unknown)
+
+    return errors
+
+
+async def validate_manim_code(manim_code: str) -> List[str]:
+    exports = await asyncio.to_thread(installed_exports)
+    return check_manim_code(manim_code, exports)
@@ -0,0 +1,75 @@
+import ast
+from functools import lru_cache
+import hashlib
+from importlib import metadata
+import json
+from typing import Optional, Tuple
+
+import redis.asyncio as redis
+
+
+@lru_cache(maxsize=1)
+def manim_version() -> str:
+    try:
+        return metadata.version("manim")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def normalize_code(manim_code: str) -> Optional[str]:
+    """AST dump of the code, so comments, blank lines and formatting don't change the key."""
+    try:
+        tree = ast.parse(manim_code)
+    except SyntaxError:
+        return None
+
+    return ast.dump(tree, annotate_fields=False, include_attributes=False)
+
+
+class RenderCache:
+    """Maps normalized manim source to an already uploaded video in S3.
+
+    Entries live in Redis with a TTL that is refreshed on every hit, so popular
+    renders stay cached and one-off renders age out on their own.
+    """
+
+    KEY = "manim:render:{digest}"
+
+    def __init__(self, redis_client: redis.Redis, ttl: int = 60 * 60 * 24 * 7):
+        self.redis = redis_client
+        self.ttl = ttl
+
+    def key_for(self, manim_code: str, render_config: Optional[dict] = None) -> Optional[str]:
+        """Key for the code rendered with render_config on top of manim's defaults, None if the code doesn't parse."""
+        normalized = normalize_code(manim_code)
+        if normalized is None:
+            return None
+
+        digest = hashlib.sha256()
+        for part in (manim_version(), json.dumps(render_config or {}, sort_keys=True), normalized):
+            digest.update(part.encode())
+            digest.update(b"\0")
+
+        return digest.hexdigest()
+
+    async def get(self, digest: str) -> Optional[Tuple[str, str]]:
+        cache_key = self.KEY.format(digest=digest)
+        entry = await self.redis.hgetall(cache_key)
+
+        if not entry or "s3_key" not in entry:
+            return None
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hincrby(cache_key, "hits", 1)
+            pipe.expire(cache_key, self.ttl)
+            await pipe.execute()
+
+        return entry["s3_bucket"], entry["s3_key"]
+
+    async def put(self, digest: str, s3_bucket: str, s3_key: str) -> None:
+        cache_key = self.KEY.format(digest=digest)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(cache_key, mapping={"s3_bucket": s3_bucket, "s3_key": s3_key, "hits": 0})
+            pipe.expire(cache_key, self.ttl)
+            await pipe.execute()
@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+import psutil
+import sys
+from typing import Optional, Tuple
+
+from app.chat.sandbox import Cgroup, RenderLimits, exit_reason
+
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = Path(__file__).with_name("render_worker.py")
+
+
+class RenderWorker:
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.jobs = 0
+        self.busy = False
+        self.cgroup: Optional[Cgroup] = None
+
+        # Kept so cpu_percent measures the time since the previous call
+        self._ps = psutil.Process(process.pid)
+        self._children: dict[int, psutil.Process] = {}
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    def rss(self) -> int:
+        try:
+            return self._ps.memory_info().rss
+        except psutil.NoSuchProcess:
+            return 0
+
+    def usage(self) -> dict:
+        """RSS and CPU of the worker and whatever it spawned (ffmpeg, latex)."""
+        try:
+            children = self._ps.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return {"pid": self.pid, "busy": self.busy, "jobs": self.jobs, "rss": 0, "cpu_percent": 0.0}
+
+        # Reuse Process objects across samples, a fresh one always reports 0% CPU
+        self._children = {child.pid: self._children.get(child.pid, child) for child in children}
+
+        rss, cpu_percent = 0, 0.0
+        for process in (self._ps, *self._children.values()):
+            try:
+                with process.oneshot():
+                    rss += process.memory_info().rss
+                    cpu_percent += process.cpu_percent(interval=None)
+            except psutil.NoSuchProcess:
+                continue
+
+        return {"pid": self.pid, "busy": self.busy, "jobs": self.jobs, "rss": rss, "cpu_percent": cpu_percent}
+
+    async def send(self, job: dict) -> None:
+        assert self.process.stdin is not None
+        self.process.stdin.write((json.dumps(job) + "\n").encode())
+        await self.process.stdin.drain()
+
+    async def receive(self) -> Optional[dict]:
+        assert self.process.stdout is not None
+        line = await self.process.stdout.readline()
+        return json.loads(line) if line else None
+
+    async def kill(self) -> None:
+        if self.alive:
+            self.process.kill()
+        await self.process.wait()
+
+        if self.cgroup:
+            self.cgroup.remove()
+
+    async def stop(self, timeout: float = 5) -> None:
+        if not self.alive:
+            if self.cgroup:
+                self.cgroup.remove()
+            return
+
+        assert self.process.stdin is not None
+        self.process.stdin.close()
+
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        await self.kill()
+
+
+class RenderWorkerPool:
+    """Pool of warm render processes that have already imported manim.
+
+    Workers are spawned lazily (or up front via `start`), reused across jobs and
+    recycled after `max_jobs` renders or once their RSS goes past `max_rss_bytes`.
+    Each one runs under `limits`, see `RenderLimits`, and shares compiled LaTeX
+    through `tex_cache_dir` when it is set.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_jobs: int = 25,
+        max_rss_bytes: int = 1536 * 1024 * 1024,
+        startup_timeout: float = 120,
+        limits: Optional[RenderLimits] = None,
+        tex_cache_dir: str = "",
+    ):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_bytes
+        self.startup_timeout = startup_timeout
+        self.limits = limits or RenderLimits()
+        self.tex_cache_dir = tex_cache_dir
+
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[RenderWorker] = []
+        self._workers: set[RenderWorker] = set()
+
+    async def start(self) -> None:
+        """Pre-spawn workers so the first renders don't pay for the manim import."""
+        missing = self.size - len(self._workers)
+        workers = await asyncio.gather(*(self._spawn() for _ in range(missing)), return_exceptions=True)
+
+        for worker in workers:
+            if isinstance(worker, RenderWorker):
+                self._idle.append(worker)
+            else:
+                logger.error(f"Failed to start render worker: {str(worker)}")
+
+    def stats(self) -> list[dict]:
+        return [worker.usage() for worker in list(self._workers) if worker.alive]
+
+    async def close(self) -> None:
+        await asyncio.gather(*(worker.stop() for worker in list(self._workers)))
+        self._idle.clear()
+        self._workers.clear()
+
+    async def render(
+        self,
+        manim_code: str,
+        output_dir: str,
+        timeout: float,
+        render_config: Optional[dict] = None,
+        scene: Optional[str] = None,
+        section: Optional[int] = None,
+    ) -> Tuple[bool, str, Optional[str]]:
+        """Run `manim_code` as `__main__` inside output_dir on a warm worker, with render_config applied on top of manim's defaults.
+
+        With `scene` only that Scene class is rendered, and with `section` only that section of it.
+        Returns whether it worked, the error, and which limit stopped the render if one did
+        (cpu, memory, file_size, open_files, timeout, killed or crashed).
+        """
+        job = {"code": manim_code, "output_dir": output_dir, "config": render_config or {}}
+        if scene:
+            job.update(scene=scene, section=section)
+
+        result, error, kill_reason = await self._run(job, timeout)
+        return result is not None, error, kill_reason
+
+    async def plan(self, manim_code: str, output_dir: str, scenes: list[str], timeout: float, render_config: Optional[dict] = None) -> Optional[dict[str, int]]:
+        """Number of sections in each of `scenes`, found with a dry run that skips every animation. None if that fails."""
+        result, error, _ = await self._run({"code": manim_code, "output_dir": output_dir, "config": render_config or {}, "plan": scenes}, timeout)
+
+        if result is None:
+            logger.warning(f"Could not plan sections: {error}")
+            return None
+
+        return result["sections"]
+
+    async def _run(self, job: dict, timeout: float) -> Tuple[Optional[dict], str, Optional[str]]:
+        """Sends one job to a worker. Returns the worker's result if it succeeded, or None, the error and the kill reason."""
+        async with self._slots:
+            worker = await self._acquire()
+            worker.busy = True
+
+            if self.limits.cpu_seconds:
+                job["cpu_seconds"] = self.limits.cpu_seconds
+
+            try:
+                await worker.send(job)
+                result = await asyncio.wait_for(worker.receive(), timeout=timeout)
+
+            except asyncio.TimeoutError:
+                await self._discard(worker)
+                return None, f"Video generation timed out after {int(timeout // 60)} minutes", "timeout"
+
+            except Exception as e:
+                await self._discard(worker)
+                return None, str(e), None
+
+            if result is None:
+                oom_kills = worker.cgroup.oom_kills() if worker.cgroup else 0
+                await self._discard(worker)
+
+                returncode = worker.process.returncode
+                return None, f"Render worker exited with code {returncode}: {self._log_tail(job['output_dir'])}", exit_reason(returncode, oom_kills)
+
+            worker.jobs += 1
+            worker.busy = False
+            await self._release(worker)
+
+            if not result.get("ok"):
+                return None, f"Manim execution failed: {result.get('error', '')}", result.get("limit")
+
+            return result, "", None
+
+    async def _acquire(self) -> RenderWorker:
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.alive:
+                return worker
+
+            self._workers.discard(worker)
+
+        return await self._spawn()
+
+    async def _release(self, worker: RenderWorker) -> None:
+        rss = worker.rss()
+
+        if worker.jobs >= self.max_jobs or rss > self.max_rss_bytes:
+            logger.info(f"Recycling render worker {worker.pid} after {worker.jobs} jobs ({rss // (1024 * 1024)} MB RSS)")
+            self._workers.discard(worker)
+            await worker.stop()
+            return
+
+        self._idle.append(worker)
+
+    async def _discard(self, worker: RenderWorker) -> None:
+        self._workers.discard(worker)
+        await worker.kill()
+
+    async def _spawn(self) -> RenderWorker:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, str(WORKER_SCRIPT), "--tex-cache-dir", self.tex_cache_dir, *self.limits.worker_args(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=2 ** 20,
+        )
+        worker = RenderWorker(process)
+
+        if self.limits.cgroup_root:
+            worker.cgroup = Cgroup.create(self.limits, f"worker-{process.pid}", process.pid)
+
+        try:
+            ready = await asyncio.wait_for(worker.receive(), timeout=self.startup_timeout)
+        except asyncio.TimeoutError:
+            ready = None
+
+        if not ready or not ready.get("ready"):
+            await worker.kill()
+            raise RuntimeError("Render worker failed to start")
+
+        self._workers.add(worker)
+        logger.info(f"Started render worker {worker.pid}")
+        return worker
+
+    @staticmethod
+    def _log_tail(output_dir: str, max_chars: int = 4000) -> str:
+        log_path = os.path.join(output_dir, "render.log")
+        if not os.path.exists(log_path):
+            return ""
+
+        with open(log_path, "r", errors="replace") as file:
+            return file.read()[-max_chars:]
@@ -0,0 +1,119 @@
+import ast
+import asyncio
+import os
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+
+def is_main_guard(node: ast.stmt) -> bool:
+    if not isinstance(node, ast.If) or not isinstance(node.test, ast.Compare):
+        return False
+
+    operands = [node.test.left, *node.test.comparators]
+    return (
+        any(isinstance(op, ast.Name) and op.id == "__name__" for op in operands)
+        and any(isinstance(op, ast.Constant) and op.value == "__main__" for op in operands)
+    )
+
+
+def _instantiated_class(node: ast.expr, classes: set[str]) -> Optional[str]:
+    if (
+        isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in classes
+        and not node.args and not node.keywords
+    ):
+        return node.func.id
+
+    return None
+
+
+def _config_assignment(stmt: ast.stmt) -> Optional[Tuple[str, Any]]:
+    """(attr, value) of a `config.<attr> = <literal>` statement."""
+    if not (
+        isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Attribute)
+        and isinstance(stmt.targets[0].value, ast.Name) and stmt.targets[0].value.id == "config"
+    ):
+        return None
+
+    try:
+        return stmt.targets[0].attr, ast.literal_eval(stmt.value)
+    except (ValueError, TypeError):
+        return None
+
+
+def scene_render_order(manim_code: str) -> Optional[Tuple[List[str], dict]]:
+    """Scene classes the `__main__` block renders, in order, and the config it sets before them.
+
+    Only understands `MyScene().render()`, `scene = MyScene(); scene.render()` and
+    `config.<attr> = <literal>` ahead of the first render. None for anything else (later
+    config changes, tempconfig, loops...), since rendering the scenes one by one would then
+    not match what the script does. Output directories are left to the renderer.
+    """
+    try:
+        tree = ast.parse(manim_code)
+    except SyntaxError:
+        return None
+
+    main_blocks = [node for node in tree.body if is_main_guard(node)]
+    if len(main_blocks) != 1:
+        return None
+
+    classes = {node.name for node in tree.body if isinstance(node, ast.ClassDef)}
+    variables: dict[str, str] = {}
+    scenes: List[str] = []
+    render_config: dict = {}
+
+    for stmt in main_blocks[0].body:
+        if isinstance(stmt, ast.Assign) and isinstance(stmt.targets[0], ast.Attribute):
+            assignment = _config_assignment(stmt)
+            if not assignment or scenes or assignment[0].endswith("_dir"):
+                return None
+
+            render_config[assignment[0]] = assignment[1]
+            continue
+
+        if (
+            isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name)
+            and (name := _instantiated_class(stmt.value, classes))
+        ):
+            variables[stmt.targets[0].id] = name
+            continue
+
+        if not (
+            isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call)
+            and isinstance(stmt.value.func, ast.Attribute) and stmt.value.func.attr == "render"
+            and not stmt.value.args and not stmt.value.keywords
+        ):
+            return None
+
+        target = stmt.value.func.value
+        if isinstance(target, ast.Name) and target.id in variables:
+            scenes.append(variables[target.id])
+        elif name := _instantiated_class(target, classes):
+            scenes.append(name)
+        else:
+            return None
+
+    return (scenes, render_config) if scenes else None
+
+
+async def concat_videos(videos: List[Path], output_path: str) -> Tuple[bool, str]:
+    """Joins videos rendered with the same settings into one, without re-encoding."""
+    list_path = f"{output_path}.txt"
+    with open(list_path, "w") as file:
+        file.writelines(f"file '{video.resolve().as_posix()}'\n" for video in videos)
+
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-c", "copy", "-movflags", "+faststart",
+        output_path,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    os.remove(list_path)
+
+    if process.returncode != 0:
+        return False, f"Failed to join rendered scenes: {stderr.decode(errors='replace')[-2000:]}"
+
+    return True, output_path
@@ -0,0 +1,287 @@
+"""Long-lived manim render worker.
+
+Started by `RenderWorkerPool`. Imports manim once, then reads one JSON job per
+line from stdin and writes one JSON result per line to the original stdout.
+Everything the scene prints goes to `render.log` in the job's output directory.
+
+A job either runs the code as a script, renders a single `scene` (optionally just
+one of its sections), or, with `plan`, counts the sections of the listed scenes.
+With `cpu_seconds`, the job gets that much CPU time before it is stopped.
+
+With `--tex-cache-dir`, LaTeX SVGs are shared between jobs and workers, see `install_tex_cache`.
+The `--limit-*` rlimits are set before anything else and inherited by ffmpeg and LaTeX.
+"""
+import argparse
+from contextlib import contextmanager
+import errno
+import hashlib
+import json
+import os
+from pathlib import Path
+import resource
+import shutil
+import signal
+import sys
+import traceback
+
+
+class LimitExceeded(Exception):
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+cpu_limited = False
+
+
+def on_cpu_limit(signum, frame):
+    # A late signal after the job already finished is not worth dying over
+    if cpu_limited:
+        raise LimitExceeded("cpu", "Render used up its CPU time")
+
+
+def apply_rlimits(address_space: int, file_size: int, open_files: int) -> None:
+    """Set by the worker on itself, the pool can't use preexec_fn safely. 0 leaves a limit off."""
+    for limit, value in (
+        (resource.RLIMIT_AS, address_space),
+        (resource.RLIMIT_FSIZE, file_size),
+        (resource.RLIMIT_NOFILE, open_files),
+    ):
+        if value:
+            # Only lowering is allowed without privileges
+            _, hard = resource.getrlimit(limit)
+            value = value if hard == resource.RLIM_INFINITY else min(value, hard)
+            resource.setrlimit(limit, (value, value))
+
+
+@contextmanager
+def cpu_limit(seconds: int):
+    """RLIMIT_CPU counts the whole process lifetime, so the soft limit is set relative to what's used so far."""
+    global cpu_limited
+
+    if not seconds:
+        yield
+        return
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime) + seconds
+
+    resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+    cpu_limited = True
+    try:
+        yield
+    finally:
+        cpu_limited = False
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+@contextmanager
+def redirect_output(log_path: str):
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    saved_stdout, saved_stderr = os.dup(1), os.dup(2)
+    log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(log_fd)
+
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        os.dup2(saved_stdout, 1)
+        os.dup2(saved_stderr, 2)
+        os.close(saved_stdout)
+        os.close(saved_stderr)
+
+
+def only_section(scene_cls: type, index: int) -> type:
+    """Subclass of `scene_cls` that only renders section `index`, -1 renders none.
+
+    Animations of the other sections are skipped, which still plays them to their end
+    state without writing frames, so the rendered section starts from the right frame.
+    """
+    from manim.scene.section import DefaultSectionType
+
+    class SectionScene(scene_cls):
+        def setup(self):
+            super().setup()
+            self.section_count = 1
+            self.renderer.file_writer.sections[-1].skip_animations = index != 0
+
+        def next_section(self, name: str = "unnamed", section_type: str = DefaultSectionType.NORMAL, skip_animations: bool = False):
+            self.section_count += 1
+            super().next_section(name, section_type, skip_animations or self.section_count - 1 != index)
+
+    SectionScene.__name__ = scene_cls.__name__
+    SectionScene.__qualname__ = scene_cls.__qualname__
+    return SectionScene
+
+
+def install_tex_cache(cache_dir: str) -> None:
+    """Looks LaTeX up in a cache shared by every worker before compiling it.
+
+    manim's own Tex dir can't be shared: it checks for the SVG before it's fully written
+    and deletes every non-SVG file in the directory after each compile. So each job keeps
+    its private Tex dir, and finished SVGs are published to `cache_dir` with an atomic
+    rename. Hits bump the mtime, which the server-side eviction uses as LRU order.
+    """
+    from manim.utils import tex_file_writing
+
+    original = tex_file_writing.tex_to_svg_file
+
+    def tex_to_svg_file(expression: str, environment: str | None = None, tex_template=None) -> Path:
+        from manim import config
+
+        template = tex_template or config["tex_template"]
+        key = hashlib.sha256(json.dumps([
+            expression,
+            environment,
+            getattr(template, "tex_compiler", ""),
+            getattr(template, "output_format", ""),
+            getattr(template, "body", repr(template)),
+        ]).encode()).hexdigest()
+
+        cached = Path(cache_dir, key[:2], f"{key}.svg")
+        try:
+            os.utime(cached)
+            return cached
+        except FileNotFoundError:
+            pass
+
+        svg_file = original(expression, environment=environment, tex_template=tex_template)
+
+        try:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            partial = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+            shutil.copyfile(svg_file, partial)
+            os.replace(partial, cached)
+        except OSError as e:
+            print(f"Could not cache {svg_file}: {e}", file=sys.stderr)
+
+        return svg_file
+
+    # The mobjects import the function by name, so replace every reference to it
+    for module in list(sys.modules.values()):
+        if getattr(module, "tex_to_svg_file", None) is original:
+            setattr(module, "tex_to_svg_file", tex_to_svg_file)
+
+
+def run_code(job: dict, main_path: str) -> dict:
+    scene_name = job.get("scene")
+    plan = job.get("plan")
+
+    # Fresh globals per job. Run as a script so the `__main__` render block fires,
+    # unless we pick the scenes to render ourselves
+    namespace = {
+        "__name__": "__main__" if not (scene_name or plan) else "__scene__",
+        "__file__": main_path,
+        "__builtins__": __builtins__,
+    }
+    exec(compile(job["code"], main_path, "exec"), namespace)
+
+    if plan:
+        sections = {}
+        for name in plan:
+            scene = only_section(namespace[name], -1)()
+            scene.render()
+            sections[name] = scene.section_count
+
+        return {"ok": True, "sections": sections}
+
+    if scene_name:
+        scene_cls = namespace[scene_name]
+        if job.get("section") is not None:
+            scene_cls = only_section(scene_cls, job["section"])
+
+        scene_cls().render()
+
+    return {"ok": True}
+
+
+def run_job(job: dict) -> dict:
+    from manim import tempconfig
+
+    output_dir = job["output_dir"]
+    main_path = os.path.join(output_dir, "main.py")
+    cwd = os.getcwd()
+
+    overrides = {"media_dir": os.path.join(output_dir, "media"), **job.get("config", {})}
+    if job.get("plan"):
+        # Nothing is written, and every section is skipped, so this only runs the scene logic
+        overrides["dry_run"] = True
+
+    with redirect_output(os.path.join(output_dir, "render.log")):
+        try:
+            os.chdir(output_dir)
+
+            with cpu_limit(job.get("cpu_seconds", 0)), tempconfig(overrides):
+                return run_code(job, main_path)
+
+        except SystemExit as e:
+            if e.code in (None, 0):
+                return {"ok": True}
+
+            return {"ok": False, "error": f"Scene exited with code {e.code}"}
+
+        except LimitExceeded as e:
+            print(str(e), file=sys.stderr)
+            return {"ok": False, "error": str(e), "limit": e.limit}
+
+        except MemoryError:
+            error = traceback.format_exc()
+            print(error, file=sys.stderr)
+            return {"ok": False, "error": "Render ran out of memory", "limit": "memory"}
+
+        except Exception as e:
+            error = traceback.format_exc()
+            print(error, file=sys.stderr)
+
+            # Python ignores SIGXFSZ, so going over RLIMIT_FSIZE shows up as EFBIG
+            if isinstance(e, OSError) and e.errno in (errno.EFBIG, errno.EMFILE):
+                return {"ok": False, "error": error, "limit": "file_size" if e.errno == errno.EFBIG else "open_files"}
+
+            return {"ok": False, "error": error}
+
+        finally:
+            os.chdir(cwd)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--tex-cache-dir", default="")
+    arg_parser.add_argument("--limit-address-space", type=int, default=0)
+    arg_parser.add_argument("--limit-file-size", type=int, default=0)
+    arg_parser.add_argument("--limit-open-files", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    apply_rlimits(args.limit_address_space, args.limit_file_size, args.limit_open_files)
+
+    # Keep the real stdout for the protocol, everything else goes to stderr
+    protocol = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+
+    signal.signal(signal.SIGXCPU, on_cpu_limit)
+
+    import manim  # noqa: F401 - the whole point of this process is to pay for this once
+
+    if args.tex_cache_dir:
+        install_tex_cache(args.tex_cache_dir)
+
+    protocol.write(json.dumps({"ready": True, "pid": os.getpid()}) + "\n")
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+
+        result = run_job(json.loads(line))
+        protocol.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,26 @@
-from fastapi import APIRouter, Body, HTTPException, status, Depends, WebSocket, Query
+from fastapi import APIRouter, Body, HTTPException, status, Depends, WebSocket, Query, Response
+from fastapi.responses import StreamingResponse
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+import json
 import logging
 from pathlib import Path
+from typing import Optional
 from pydantic import BaseModel
 
+from sqlalchemy import tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import defer, joinedload, selectinload
 
 from app.chat.llm import model, parser, scripting_model
-from app.chat.llm.parser import simple_parser
+from app.chat.llm.parser import StreamingPythonParser, simple_parser, code_hash
 from app.chat.llm.prompts import get_system_prompt, get_chat_title_prompt
+from app.chat.llm.validator import validate_manim_code
         
 from app.config import config
-from app.database.core import get_db_async
-from app.database.models import Chat, Message, Video, Credits
+from app.database.core import get_db_async, AsyncSessionLocal
+from app.database.models import Chat, Message, Video
+from app.database.pagination import encode_cursor, decode_cursor
 from app.clerk import get_current_user, get_current_user_ws_dummy
 from app.schemas import TokenData, DummyRequest
 
@@ -42,46 +48,92 @@ class ChatRequest(BaseModel):
 
 
 @router.get('/messages/{chat_id}')
-async def get_messages(chat_id: str, db: AsyncSession = Depends(get_db_async)):
-    result = await db.execute(select(Message).where(Message.chat_id == chat_id))
+async def get_messages(
+    chat_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = Query(None),
+    db: AsyncSession = Depends(get_db_async)
+):
+    query = (
+        select(Message)
+        .options(joinedload(Message.video), defer(Message.response))
+        .where(Message.chat_id == chat_id)
+        .order_by(Message.created_at, Message.id)
+        .limit(limit + 1)
+    )
+
+    after = decode_cursor(cursor)
+    if after:
+        query = query.where(tuple_(Message.created_at, Message.id) > after)
+
+    result = await db.execute(query)
     messages = result.scalars().all()
-    video_urls: list[str] = []
 
+    if len(messages) > limit:
+        messages = messages[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(messages[-1].created_at, messages[-1].id)
+
+    video_urls = await task_manager.get_video_urls_aws(
+        [(message.video.id, message.video.s3_bucket, message.video.s3_key) for message in messages if message.video],
+        expiry=3600
+    )
+
+    # The raw response is only read for rows written by an older version before the backfill ran
+    unparsed = [message.id for message in messages if message.message is None]
+    raw_responses = {}
+    if unparsed:
+        result = await db.execute(
+            select(Message.id, Message.response)
+            .where(Message.id.in_(unparsed), Message.response.is_not(None))
+        )
+        raw_responses = dict(result.all())
+
+    page = []
     for message in messages:
-        if message.video_id:
-            result = await db.execute(select(Video).where(Video.id == message.video_id))
-            video = result.scalar_one_or_none()
-
-            if video:
-                s3_bucket = video.s3_bucket
-                s3_key = video.s3_key
-                video_url = await task_manager.get_video_url_aws(video.id, s3_bucket, s3_key, expiry=3600)
-                video_urls.append(video_url)
-            else:
-                video_urls.append(None)
-        else:
-            video_urls.append(None)
+        text, code = message.message, message.code
 
-    messages = [
-        {
+        if raw_response := raw_responses.get(message.id):
+            parsed = simple_parser(raw_response)
+            text, code = parsed["message"], parsed["code"]
+
+        page.append({
             "id": message.id,
             "prompt": message.prompt,
-            "response": simple_parser(message.response)["message"] if message.response else None,
-            "code": simple_parser(message.response)["code"] if message.response else None,
-            "video_url": video_urls[i],
+            "response": text,
+            "code": code,
+            "video_url": video_urls.get(message.video.id) if message.video else None,
             "created_at": message.created_at
-        } for i, message in enumerate(messages)
-    ]
+        })
 
-    return sorted(messages, key=lambda x: x["created_at"])
+    return page
 
 @router.get('/history')
 async def get_chats(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None),
     current_user: TokenData = Depends(get_current_user), 
     db: AsyncSession = Depends(get_db_async)
 ):
-    result = await db.execute(select(Chat).where(Chat.user_id == current_user.user_id).order_by(Chat.created_at.desc()))
-    chats = result.scalars().all()
+    # Newest first, served from ix_chats_user_id_created_at
+    query = (
+        select(Chat.id, Chat.title, Chat.created_at)
+        .where(Chat.user_id == current_user.user_id)
+        .order_by(Chat.created_at.desc(), Chat.id.desc())
+        .limit(limit + 1)
+    )
+
+    before = decode_cursor(cursor)
+    if before:
+        query = query.where(tuple_(Chat.created_at, Chat.id) < before)
+
+    result = await db.execute(query)
+    chats = result.all()
+
+    if len(chats) > limit:
+        chats = chats[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(chats[-1].created_at, chats[-1].id)
 
     return [{"id": chat.id, "title": chat.title} for chat in chats]
 
@@ -97,12 +149,11 @@ async def create_chat(
             detail="Video generation already in progess. Cannot send a message."
         )
 
-    result = await db.execute(select(Credits).where(Credits.user_id == current_user.user_id))
-    db_credits = result.scalar_one_or_none()
+    balance = await task_manager.credits_cache.balance(db, current_user.user_id)
 
-    assert db_credits is not None
+    assert balance is not None
 
-    if not await db_credits.get_current_credits(db):
+    if not balance[0]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient credits")
 
     prompt = chat_request.prompt
@@ -164,78 +215,120 @@ async def chat_ws(
     token: str = Query(...),
     dummy_request: DummyRequest = Depends(lambda token: DummyRequest(headers={"Authorization": f"Bearer {token}"})),
     # current_user: TokenData = Depends(get_current_user_ws_dummy),
-    db: AsyncSession = Depends(get_db_async)
 ):
-    current_user = await get_current_user_ws_dummy(dummy_request, db)
+    # Sessions are opened only around the queries: holding one across the LLM stream pins a pooled connection for minutes
+    async with AsyncSessionLocal() as db:
+        current_user = await get_current_user_ws_dummy(dummy_request, db)
 
-    if not await task_manager.can_user_submit_task(user_id=current_user.user_id):
-        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="User already has an active task")
+        if not await task_manager.can_user_submit_task(user_id=current_user.user_id):
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="User already has an active task")
 
-    result = await db.execute(select(Credits).where(Credits.user_id == current_user.user_id))
-    db_credits = result.scalar_one_or_none()
+        balance = await task_manager.credits_cache.balance(db, current_user.user_id)
 
-    assert db_credits is not None
+        assert balance is not None
 
-    if not await db_credits.get_current_credits(db):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient credits")
+        if not balance[0]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient credits")
 
-    result = await db.execute(
-        select(Chat)
-        .options(selectinload(Chat.messages))
-        .where(Chat.id == chat_id, Chat.user_id == current_user.user_id)
-    )
-    chat = result.scalar_one_or_none()
+        result = await db.execute(
+            select(Chat)
+            .options(selectinload(Chat.messages))
+            .where(Chat.id == chat_id, Chat.user_id == current_user.user_id)
+        )
+        chat = result.scalar_one_or_none()
 
-    if not chat:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+        if not chat:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
 
-    prev_messages = chat.messages
+        history = []
+        for message in chat.messages:
+            history.append(HumanMessage(message.prompt))
+            history.append(AIMessage(message.response if message.response else ""))
 
     await ws.accept()
     output = ""
 
     try:
-        history = []
-        for message in prev_messages:
-            history.append(HumanMessage(message.prompt))
-            history.append(AIMessage(message.response if message.response else ""))
-
         data = await ws.receive_text()
 
         # Add message to database
-        db_message = Message(chat_id=chat.id, prompt=data)
-        db.add(db_message)
-        await db.commit()
-        await db.refresh(db_message)
+        async with AsyncSessionLocal() as db:
+            db_message = Message(chat_id=chat_id, prompt=data)
+            db.add(db_message)
+            await db.commit()
+            await db.refresh(db_message)
 
+        message_id = db_message.id
 
         # Generation
         messages = [SystemMessage(get_system_prompt())] + history[-6:] + [HumanMessage(data)]
 
+        stream_parser = StreamingPythonParser()
+        manim_code = None
+        validation_errors: list[str] = []
+        submit_error: Optional[str] = None
+
+        async def submit(code: str) -> Optional[str]:
+            """Queues the render. Returns why it couldn't be queued, so the stream and the save still go through."""
+            try:
+                await task_manager.submit_task(
+                    user_id=current_user.user_id, 
+                    chat_id=chat_id, 
+                    message_id=message_id,
+                    manim_code=code
+                )
+            except HTTPException as e:
+                return str(e.detail)
+            except Exception as e:
+                logger.error(f"Failed to queue the render of message {message_id}: {str(e)}")
+                return "Video generation could not be queued"
+
+            return None
+
         async for chunk in model.astream(messages):
             await ws.send_text(chunk.content)
             print(chunk.content)
             output += chunk.content
 
+            # Submit the moment the closing fence arrives instead of after the whole stream and DB commit
+            for event in stream_parser.feed(chunk.content):
+                if event.kind == "code_end" and manim_code is None:
+                    manim_code = stream_parser.code_blocks[0]
+
+                    # Broken code fails here instead of taking a worker slot
+                    if manim_code and not (validation_errors := await validate_manim_code(manim_code)):
+                        submit_error = await submit(manim_code)
+
         # Update response
-        db_message.response = output
-        await db.commit()
-        await db.refresh(db_message)
+        parsed = simple_parser(output)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Message)
+                .where(Message.id == message_id)
+                .values(
+                    response=output,
+                    message=parsed["message"],
+                    code=parsed["code"],
+                    code_hash=code_hash(parsed["code_body"]),
+                )
+            )
+            await db.commit()
         
         logger.info(output)
         await ws.send_text("<done/>")
-    
-        manim_code = parser.parse_and_return_code(output)
-
-        # Submit task for video generation
-        if manim_code:
-            await task_manager.submit_task(
-                user_id=current_user.user_id, 
-                chat_id=chat_id, 
-                message_id=db_message.id,
-                manim_code=manim_code
-            )
 
+        if manim_code is None and (manim_code := parser.parse_and_return_code(output)):
+            # Fallback for anything the incremental parser didn't recognise as a ```py block
+            if not (validation_errors := await validate_manim_code(manim_code)):
+                submit_error = await submit(manim_code)
+
+        if validation_errors:
+            logger.warning(f"Generated code for message {message_id} failed validation: {validation_errors}")
+            await ws.send_text(f"<failed>{json.dumps({'errors': validation_errors})}</failed>")
+        elif submit_error:
+            logger.warning(f"Render of message {message_id} was not queued: {submit_error}")
+            await ws.send_text(f"<failed>{json.dumps({'errors': [submit_error]})}</failed>")
+        elif manim_code:
             await ws.send_text("<queued/>")
 
     except Exception as e:
@@ -256,6 +349,31 @@ async def get_running_chat(
 
     return task_data
 
+@router.get('/running/stream')
+async def stream_running_chat(
+    token: str = Query(...),
+    dummy_request: DummyRequest = Depends(lambda token: DummyRequest(headers={"Authorization": f"Bearer {token}"})),
+):
+    """Server-sent events for the user's active task. EventSource can't set headers, so the token comes in the query."""
+    # The stream can stay open for minutes, so don't hold a pooled connection for it
+    async with AsyncSessionLocal() as db:
+        current_user = await get_current_user_ws_dummy(dummy_request, db)
+
+    async def events():
+        first = True
+        async for event in task_manager.stream_task_status(user_id=current_user.user_id):
+            if event is None and not first:
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {json.dumps(event)}\n\n"
+            first = False
+
+    return StreamingResponse(
+        events(), 
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get('/message/video/{message_id}')
 async def get_video_url(
     message_id: str,
@@ -290,12 +408,13 @@ async def get_credits_info(
     current_user: TokenData = Depends(get_current_user),
     db: AsyncSession = Depends(get_db_async),
 ):
-    result = await db.execute(select(Credits).where(Credits.user_id == current_user.user_id))
-    credits = result.scalar_one_or_none()
+    balance = await task_manager.credits_cache.balance(db, current_user.user_id)
     
-    assert credits is not None
+    assert balance is not None
+
+    amount, refreshed_at = balance
     
     return {
-        "credits": await credits.get_current_credits(db),
-        "refreshed_at": credits.refreshed_at
+        "credits": amount,
+        "refreshed_at": refreshed_at
     }
\ No newline at end of file
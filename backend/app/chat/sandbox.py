@@ -0,0 +1,119 @@
+from dataclasses import dataclass
+import logging
+import os
+import signal
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RenderLimits:
+    """Resource limits for render workers. A value of 0 leaves that limit off.
+
+    rlimits are passed to the worker, which sets them on itself when it starts, and
+    inherited by ffmpeg/latex; the CPU limit is re-armed by the worker before every job. With `cgroup_root` (a cgroup v2
+    directory delegated to this process) each worker also gets its own cgroup with a
+    CPU quota and a hard memory limit.
+    """
+    address_space_bytes: int = 0
+    cpu_seconds: int = 0
+    file_size_bytes: int = 0
+    open_files: int = 0
+    cgroup_root: str = ""
+    cgroup_cpus: float = 0
+    cgroup_memory_bytes: int = 0
+
+    def worker_args(self) -> list[str]:
+        """Command line arguments for render_worker.py. Not a preexec_fn, which can deadlock a fork from a threaded process."""
+        return [
+            "--limit-address-space", str(self.address_space_bytes),
+            "--limit-file-size", str(self.file_size_bytes),
+            "--limit-open-files", str(self.open_files),
+        ]
+
+    def describe(self) -> dict:
+        """The limits a render runs under, as stored on the task."""
+        limits = {
+            "limit_address_space": self.address_space_bytes,
+            "limit_cpu_seconds": self.cpu_seconds,
+            "limit_file_size": self.file_size_bytes,
+            "limit_open_files": self.open_files,
+        }
+
+        if self.cgroup_root:
+            limits["cpu_quota"] = self.cgroup_cpus
+            limits["limit_memory"] = self.cgroup_memory_bytes
+
+        return {key: value for key, value in limits.items() if value}
+
+
+class Cgroup:
+    """A cgroup v2 directory for one worker process and its children."""
+
+    PERIOD = 100_000
+
+    def __init__(self, root: str, name: str):
+        self.path = os.path.join(root, name)
+
+    @classmethod
+    def create(cls, limits: RenderLimits, name: str, pid: int) -> Optional["Cgroup"]:
+        cgroup = cls(limits.cgroup_root, name)
+
+        try:
+            os.makedirs(cgroup.path, exist_ok=True)
+
+            if limits.cgroup_cpus:
+                cgroup._write("cpu.max", f"{int(limits.cgroup_cpus * cls.PERIOD)} {cls.PERIOD}")
+            if limits.cgroup_memory_bytes:
+                cgroup._write("memory.max", str(limits.cgroup_memory_bytes))
+                cgroup._write("memory.swap.max", "0")
+
+            cgroup._write("cgroup.procs", str(pid))
+        except OSError as e:
+            logger.error(f"Could not set up cgroup {cgroup.path}, running without it: {str(e)}")
+            cgroup.remove()
+            return None
+
+        return cgroup
+
+    def oom_kills(self) -> int:
+        try:
+            with open(os.path.join(self.path, "memory.events")) as file:
+                for line in file:
+                    key, value = line.split()
+                    if key == "oom_kill":
+                        return int(value)
+        except OSError:
+            pass
+
+        return 0
+
+    def remove(self) -> None:
+        try:
+            os.rmdir(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove cgroup {self.path}: {str(e)}")
+
+    def _write(self, filename: str, value: str) -> None:
+        with open(os.path.join(self.path, filename), "w") as file:
+            file.write(value)
+
+
+def exit_reason(returncode: Optional[int], oom_kills: int = 0) -> str:
+    """Why a worker process died, from its exit status."""
+    if oom_kills:
+        return "memory"
+
+    if returncode is not None and returncode < 0:
+        return {
+            signal.SIGXCPU: "cpu",
+            signal.SIGXFSZ: "file_size",
+            signal.SIGKILL: "killed",
+            signal.SIGSEGV: "crashed",
+        }.get(-returncode, "crashed")
+
+    return "crashed"
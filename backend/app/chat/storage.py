@@ -0,0 +1,94 @@
+import asyncio
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from contextlib import AsyncExitStack
+import aioboto3
+import os
+import time
+from typing import Any, Optional
+
+
+class S3Storage:
+    """One long-lived S3 client per process instead of a Session + client per call.
+
+    The client is created on first use and closed by `close`, normally from the app lifespan.
+    """
+
+    def __init__(
+        self, 
+        region: str, 
+        aws_access_key_id: str, 
+        aws_secret_access_key: str,
+        endpoint_url: Optional[str] = None,
+        max_pool_connections: int = 32,
+        multipart_threshold: int = 16 * 1024 * 1024,
+        multipart_chunksize: int = 16 * 1024 * 1024,
+        max_concurrency: int = 8,
+    ):
+        self.region = region
+        self.endpoint_url = endpoint_url
+        self.session = aioboto3.Session(
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key
+        )
+
+        # Enough pooled connections for every upload's parts plus presigning
+        self.client_config = Config(max_pool_connections=max_pool_connections)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+        )
+
+        self._client: Optional[Any] = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._lock = asyncio.Lock()
+
+    async def client(self) -> Any:
+        if self._client is not None:
+            return self._client
+
+        async with self._lock:
+            if self._client is None:
+                self._exit_stack = AsyncExitStack()
+                self._client = await self._exit_stack.enter_async_context(
+                    self.session.client(
+                        "s3", 
+                        region_name=self.region, 
+                        endpoint_url=self.endpoint_url, 
+                        config=self.client_config
+                    )
+                )
+
+        return self._client
+
+    async def presign_get(self, s3_bucket: str, s3_key: str, expires_in: int) -> str:
+        # Pure local signing, the client never talks to S3 here
+        s3_client = await self.client()
+        return await s3_client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": s3_bucket, "Key": s3_key},
+            ExpiresIn=expires_in
+        )
+
+    async def upload_file(self, file_path: str, s3_bucket: str, s3_key: str) -> dict:
+        """Streams file_path from disk to S3, multipart above the threshold. Returns upload metrics."""
+        s3_client = await self.client()
+        size = os.path.getsize(file_path)
+        started_at = time.perf_counter()
+
+        await s3_client.upload_file(file_path, s3_bucket, s3_key, Config=self.transfer_config)
+
+        seconds = time.perf_counter() - started_at
+        return {
+            "upload_bytes": size,
+            "upload_seconds": round(seconds, 3),
+            "upload_mbps": round(size * 8 / (seconds or 1e-9) / 1e6, 2),
+        }
+
+    async def close(self) -> None:
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+
+        self._client = None
+        self._exit_stack = None
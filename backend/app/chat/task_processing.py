@@ -1,23 +1,35 @@
 import asyncio
-import aioboto3
-from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, asdict
+from datetime import datetime
 from enum import Enum
 from fastapi import HTTPException, status
+import json
 import logging
+import math
 import os
 from pathlib import Path
 import psutil
 import redis.asyncio as redis
 import time
-from typing import Optional, Tuple
+from typing import AsyncIterator, Optional, Tuple
 import uuid
 
+from app.cache import TTLCache
 from app.config import config
 from app.database.core import AsyncSessionLocal
-from app.database.models import Credits, Message, Video
+from app.database.models import Credits, Message, Video, uuid_str
+from app.chat.admission import AdmissionController
+from app.chat.credits_cache import CreditsCache
+from app.chat.render_cache import RenderCache
+from app.chat.render_pool import RenderWorkerPool
+from app.chat.render_split import concat_videos, scene_render_order
+from app.chat.sandbox import RenderLimits
+from app.chat.tex_cache import TexCache
+from app.chat.workspace import WorkspaceManager
+from app.chat.write_batch import WriteBatcher
+from app.chat.storage import S3Storage
 
-from sqlalchemy import select
+from sqlalchemy import insert, select, update
 
 
 logger = logging.getLogger(__name__)
@@ -28,6 +40,15 @@ class TaskStatus(Enum):
     COMPLETED = 'completed'
     FAILED = 'failed'
 
+class RenderPhase(Enum):
+    PREVIEW = 'preview'
+    FINAL = 'final'
+
+class TaskPriority(Enum):
+    # Strict classes, a lower value is always dequeued first
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
 @dataclass
 class TaskInfo:
     id: str
@@ -37,28 +58,187 @@ class TaskInfo:
     status: TaskStatus
     created_at: float
     instance_id: str
+    phase: RenderPhase = RenderPhase.FINAL
+    priority: TaskPriority = TaskPriority.INTERACTIVE
+    tier: str = 'free'
     started_at: Optional[float] = None
     completed_at: Optional[float] = None
     result: Optional[str] = None
     error: Optional[str] = None
 
+@dataclass
+class VideoCompletion:
+    chat_id: str
+    message_id: str
+    user_id: str
+    s3_bucket: str
+    s3_key: str
+
+# The queue is a sorted set scheduled with self-clocked weighted fair queuing. A task's
+# virtual finish time is max(virtual clock, its user's previous finish) + 1 / tier weight,
+# and the virtual clock follows the finish time of the last dequeued task. A user who
+# submits a lot falls behind users who don't, and heavier tiers fall behind slower.
+# Priority classes are strict: each one is offset by PRIORITY_SPAN in the score. Background
+# tasks also go into a waiting-since set, and one that has waited past the cap is dequeued
+# ahead of everything else, so a steady stream of interactive work can't starve it.
+# Every enqueue also pushes a token onto a signal list to wake up an idle processor, and
+# every dequeue takes one off, so the list holds about one token per queued task.
+SCHEDULE_LUA = """
+local PRIORITY_SPAN = 1e12
+
+local function schedule(queue_key, vclock_key, finish_key, signal_key, task_id, priority, weight, ttl)
+    local vclock = tonumber(redis.call('GET', vclock_key) or '0')
+    local start = math.max(vclock, tonumber(redis.call('GET', finish_key) or '0'))
+    local finish = start + 1 / tonumber(weight)
+
+    redis.call('SET', finish_key, finish, 'EX', ttl)
+    redis.call('ZADD', queue_key, tonumber(priority) * PRIORITY_SPAN + finish, task_id)
+    redis.call('LPUSH', signal_key, 1)
+    redis.call('LTRIM', signal_key, 0, 99)
+end
+"""
+
+# Moves a task from a processing list back to the front of its priority class,
+# only if it is still there, so concurrent reapers can't requeue it twice
+REQUEUE_SCRIPT = SCHEDULE_LUA + """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 1 then
+    redis.call('HSET', KEYS[3], 'status', ARGV[2], 'attempts', ARGV[3])
+    redis.call('HDEL', KEYS[3], 'heartbeat_at')
+    local vclock = tonumber(redis.call('GET', KEYS[4]) or '0')
+    redis.call('ZADD', KEYS[2], tonumber(ARGV[6]) * PRIORITY_SPAN + vclock, ARGV[1])
+    redis.call('LPUSH', KEYS[5], 1)
+    redis.call('PUBLISH', ARGV[4], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+# Claims the user's active-task slot and enqueues the task in one round-trip.
+# Returns 0 without touching anything if the user already has an active task.
+SUBMIT_SCRIPT = SCHEDULE_LUA + """
+if not redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return 0
+end
+redis.call('HSET', KEYS[2], unpack(ARGV, 7))
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+schedule(KEYS[3], KEYS[4], KEYS[5], KEYS[6], ARGV[1], ARGV[5], ARGV[6], ARGV[2])
+redis.call('PUBLISH', ARGV[3], ARGV[4])
+return 1
+"""
+
+# Releases the user's active-task slot only if it still belongs to this task, so a late
+# release can't unlock a task the user submitted since.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+ENQUEUE_SCRIPT = SCHEDULE_LUA + """
+schedule(KEYS[1], KEYS[2], KEYS[3], KEYS[4], ARGV[1], ARGV[2], ARGV[3], ARGV[4])
+if tonumber(ARGV[2]) > 0 then
+    redis.call('ZADD', KEYS[5], ARGV[5], ARGV[1])
+end
+return 1
+"""
+
+# Pops the task with the lowest score into a processing list and advances the virtual clock.
+# Atomic, so any number of instances can pull concurrently. Takes the task's signal token
+# too, unless ARGV[1] is 0 because the caller already took one to wake up. A background task
+# queued at or before ARGV[2] (a timestamp, '-inf' for no cap) goes first.
+DEQUEUE_SCRIPT = """
+local popped
+local overdue = redis.call('ZRANGEBYSCORE', KEYS[5], '-inf', ARGV[2], 'LIMIT', 0, 1)
+if #overdue > 0 then
+    local score = redis.call('ZSCORE', KEYS[1], overdue[1])
+    if score then
+        redis.call('ZREM', KEYS[1], overdue[1])
+        popped = {overdue[1], score}
+    end
+end
+
+if not popped then
+    popped = redis.call('ZPOPMIN', KEYS[1])
+    if #popped == 0 then
+        return false
+    end
+end
+redis.call('ZREM', KEYS[5], popped[1])
+
+if ARGV[1] == '1' then
+    redis.call('LPOP', KEYS[4])
+end
+
+local finish = tonumber(popped[2]) % 1e12
+if finish > tonumber(redis.call('GET', KEYS[3]) or '0') then
+    redis.call('SET', KEYS[3], finish)
+end
+
+redis.call('LPUSH', KEYS[2], popped[1])
+return popped[1]
+"""
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
 class RedisTaskManager:
     
-    def __init__(self, redis_url: str, max_workers: Optional[int] = None):
+    def __init__(self, redis_url: str, max_workers: Optional[int] = None, redis_client: Optional[redis.Redis] = None):
 
         cpu_count = psutil.cpu_count(logical=False)
         
+        # Upper bound only, the admission controller decides how many actually run
         if max_workers is None:
-            max_workers = max(1, int(cpu_count * 0.7))
+            max_workers = int(config.get('RENDER_MAX_WORKERS', 0)) or max(1, int(cpu_count * 0.7))
         
         self.max_workers = max_workers
-        self.redis = redis.from_url(redis_url, decode_responses=True)
+        # redis_client lets benchmarks run against fakeredis
+        self.redis = redis_client or redis.from_url(redis_url, decode_responses=True)
 
         self.semaphore = asyncio.Semaphore(max_workers)
-        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+
+        # Per-render limits so one runaway scene can't starve the other workers on the box
+        self.render_limits = RenderLimits(
+            address_space_bytes=int(config.get('RENDER_LIMIT_MEMORY_MB', 4096)) * 1024 * 1024,
+            cpu_seconds=int(config.get('RENDER_LIMIT_CPU_SECONDS', 60 * 20)),
+            file_size_bytes=int(config.get('RENDER_LIMIT_FILE_SIZE_MB', 2048)) * 1024 * 1024,
+            open_files=int(config.get('RENDER_LIMIT_OPEN_FILES', 1024)),
+            cgroup_root=config.get('RENDER_CGROUP_ROOT', ''),
+            cgroup_cpus=float(config.get('RENDER_CGROUP_CPUS', 1)),
+            cgroup_memory_bytes=int(config.get('RENDER_CGROUP_MEMORY_MB', 4096)) * 1024 * 1024,
+        )
+
+        # One render directory per task, on tmpfs when there's room, removed when the task is done
+        self.workspaces = WorkspaceManager(
+            root=config.get('RENDER_WORKSPACE_DIR', f"{os.getcwd()}/output"),
+            max_bytes=int(config.get('RENDER_DISK_BUDGET_MB', 20 * 1024)) * 1024 * 1024,
+            scratch_root=config.get('RENDER_SCRATCH_DIR', ''),
+            scratch_min_free_bytes=int(config.get('RENDER_SCRATCH_MIN_FREE_MB', 2048)) * 1024 * 1024,
+        )
+
+        # Compiled LaTeX shared by every render on the box, bounded and evicted LRU
+        tex_cache_dir = config.get('RENDER_TEX_CACHE_DIR', f"{os.getcwd()}/cache/tex")
+        self.tex_cache = TexCache(
+            tex_cache_dir,
+            max_bytes=int(config.get('RENDER_TEX_CACHE_MAX_MB', 512)) * 1024 * 1024,
+        ) if tex_cache_dir else None
+
+        # Warm manim processes, sized like the semaphore so every slot has a worker.
+        # Scenes split into pieces share the same workers, so a single task can use idle ones
+        self.render_pool = RenderWorkerPool(
+            size=max_workers,
+            max_jobs=int(config.get('RENDER_WORKER_MAX_JOBS', 25)),
+            max_rss_bytes=int(config.get('RENDER_WORKER_MAX_RSS_MB', 1536)) * 1024 * 1024,
+            limits=self.render_limits,
+            tex_cache_dir=tex_cache_dir,
+        )
+        self.admission = AdmissionController(
+            self.render_pool,
+            max_cpu_percent=float(config.get('ADMISSION_MAX_CPU_PERCENT', 85)),
+            min_free_memory_bytes=int(config.get('ADMISSION_MIN_FREE_MEMORY_MB', 1024)) * 1024 * 1024,
+            render_memory_bytes=int(config.get('ADMISSION_RENDER_MEMORY_MB', 1024)) * 1024 * 1024,
+        )
         
         import socket
         self.instance_id = socket.gethostname()
@@ -66,18 +246,93 @@ class RedisTaskManager:
         # Redis keys
         self.TASK_KEY = "manim:task:{task_id}"
         self.USER_ACTIVE_TASK = "manim:user:{user_id}:active"
-        self.QUEUE_KEY = "manim:queue"
+        self.QUEUE_KEY = "manim:schedule"
+        self.QUEUE_SIGNAL_KEY = "manim:schedule:signal"
+        self.VCLOCK_KEY = "manim:schedule:vclock"
+        self.BACKGROUND_SINCE_KEY = "manim:schedule:background"
+        self.USER_FINISH_KEY = "manim:user:{user_id}:vfinish"
+        self.PROCESSING_KEY = "manim:processing:{instance_id}"
+        self.INSTANCES_KEY = "manim:instances"
+        self.INSTANCE_ALIVE_KEY = "manim:instance:{instance_id}:alive"
         self.STATS_KEY =  "manim:stats"
         self.VIDEO_KEY = "manim:video:{video_id}"
+        self.STATUS_CHANNEL = "manim:status:{user_id}"
+
+        self.storage = S3Storage(
+            region=config['AWS_BUCKET_REGION'],
+            aws_access_key_id=config['AWS_ACCESS_KEY_ID'],
+            aws_secret_access_key=config['AWS_SECRET_ACCESS_KEY'],
+            endpoint_url=config.get('AWS_S3_ENDPOINT_URL') or None,
+            max_pool_connections=int(config.get('S3_MAX_POOL_CONNECTIONS', 32)),
+            multipart_threshold=int(config.get('S3_MULTIPART_THRESHOLD_MB', 16)) * 1024 * 1024,
+            multipart_chunksize=int(config.get('S3_MULTIPART_CHUNK_MB', 16)) * 1024 * 1024,
+            max_concurrency=int(config.get('S3_MAX_CONCURRENCY', 8)),
+        )
+
+        # Presigned URLs are cached in Redis until PRESIGN_MARGIN seconds before they expire,
+        # with a small per-process LRU in front that never outlives that margin
+        self.PRESIGN_MARGIN = 300
+        self._video_url_cache = TTLCache(
+            maxsize=int(config.get('VIDEO_URL_CACHE_SIZE', 4096)),
+            ttl=min(int(config.get('VIDEO_URL_CACHE_TTL', 300)), self.PRESIGN_MARGIN)
+        )
+
+        # Identical scenes (after normalization) reuse the video that is already in S3
+        self.split_renders = config.get('RENDER_SPLIT', 'TRUE') == 'TRUE'
+        self.render_cache = RenderCache(self.redis, ttl=int(config.get('RENDER_CACHE_TTL', 60 * 60 * 24 * 7)))
+        self.credits_cache = CreditsCache(self.redis, ttl=int(config.get('CREDITS_CACHE_TTL', 60)))
+
+        # Renders finishing together can share one transaction for their video rows, off (1) by default
+        self.video_writes = WriteBatcher(
+            self._save_videos,
+            max_size=int(config.get('DB_WRITE_BATCH_SIZE', 1)),
+            max_delay=int(config.get('DB_WRITE_BATCH_DELAY_MS', 50)) / 1000,
+        )
+
+        # Two-phase mode: a quick 480p15 preview first, then the full render queued behind everything else
+        self.preview_enabled = config.get('RENDER_PREVIEW', 'FALSE') == 'TRUE'
+        self.PREVIEW_CONFIG = {"pixel_height": 480, "pixel_width": 854, "frame_rate": 15}
+
+        # Reliable queue: tasks in a processing list whose heartbeat goes stale are re-queued (or failed)
+        self.heartbeat_interval = int(config.get('TASK_HEARTBEAT_INTERVAL', 10))
+        self.visibility_timeout = int(config.get('TASK_VISIBILITY_TIMEOUT', 60))
+        self.max_attempts = int(config.get('TASK_MAX_ATTEMPTS', 2))
+        # How long a shutdown waits for running renders before leaving them to the reaper
+        self.drain_timeout = float(config.get('TASK_DRAIN_TIMEOUT', 30))
+        self._requeue_script = self.redis.register_script(REQUEUE_SCRIPT)
+        self._submit_script = self.redis.register_script(SUBMIT_SCRIPT)
+        self._enqueue_script = self.redis.register_script(ENQUEUE_SCRIPT)
+        self._dequeue_script = self.redis.register_script(DEQUEUE_SCRIPT)
+        self._release_script = self.redis.register_script(RELEASE_SCRIPT)
+
+        # Fair-share weights per billing tier, e.g. "free:1,paid:4" gives paid users 4x the share
+        self.tier_weights = {
+            tier: float(weight)
+            for tier, weight in (item.split(':') for item in config.get('SCHEDULER_TIER_WEIGHTS', 'free:1,paid:4').split(','))
+        }
+        # Seconds a background task (a full render after its preview) waits at most, 0 for no cap
+        self.background_max_wait = float(config.get('SCHEDULER_BACKGROUND_MAX_WAIT', 120))
+        # Used for start estimates until there are render stats
+        self.estimated_task_seconds = float(config.get('TASK_ESTIMATED_SECONDS', 60))
 
         logger.info(f"Initialized RedisTaskManager on {self.instance_id} with {max_workers} workers")
         
         # Start continuous queue processing
         self._queue_processor_task: asyncio.Task | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        self._running_tasks: set[asyncio.Task] = set()
+        self._active_task_ids: set[str] = set()
+        # Running tasks that wrote a terminal status or are going back to the queue
+        self._settled_task_ids: set[str] = set()
         self._shutdown = False
     
-    def get_system_stats(self):
-        pass
+    def get_system_stats(self) -> dict:
+        """Served by the unauthenticated /health/render, so it leaves out hostnames and per-worker details."""
+        return {
+            "max_workers": self.max_workers,
+            "running": len(self._active_task_ids),
+            **self.admission.stats(),
+        }
 
     async def get_task_status(self, task_id: str):
         task_key = self.TASK_KEY.format(task_id=task_id)
@@ -111,9 +366,41 @@ class RedisTaskManager:
         
         if task_data.get("error"):
             response["error"] = task_data["error"]
+
+        if task_data.get("kill_reason"):
+            response["kill_reason"] = task_data["kill_reason"]
+
+        if task_data.get("phase"):
+            response["phase"] = task_data["phase"]
+
+        if task_data.get("preview_url"):
+            response["preview_url"] = task_data["preview_url"]
+
+        if task_data["status"] == TaskStatus.QUEUED.value:
+            response.update(await self.get_queue_estimate(task_id))
         
         return response
 
+    async def get_queue_estimate(self, task_id: str) -> dict:
+        """Position of a queued task and a rough start time, from the average task duration and the number of workers."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrank(self.QUEUE_KEY, task_id)
+            pipe.hmget(self.STATS_KEY, "tasks", "task_seconds")
+            pipe.scard(self.INSTANCES_KEY)
+            rank, (tasks, task_seconds), instances = await pipe.execute()
+
+        if rank is None:
+            return {}
+
+        average = float(task_seconds) / int(tasks) if tasks and int(tasks) else self.estimated_task_seconds
+        # Assumes every instance runs as many workers as this one
+        capacity = self.max_workers * max(1, instances)
+
+        return {
+            "queue_position": rank + 1,
+            "estimated_start_at": time.time() + math.ceil((rank + 1) / capacity) * average,
+        }
+
 
     async def can_user_submit_task(self, user_id: str) -> bool:
         active_task_id = await self.redis.get(self.USER_ACTIVE_TASK.format(user_id=user_id))
@@ -125,27 +412,96 @@ class RedisTaskManager:
         task_id = await self.redis.get(self.USER_ACTIVE_TASK.format(user_id=user_id))
         return task_id
 
+    async def stream_task_status(self, user_id: str, keepalive: float = 15) -> AsyncIterator[Optional[dict]]:
+        """Yields the user's active task status, then every transition until it finishes.
+
+        Subscribes before reading the snapshot so no transition is lost in between.
+        Yields None when there's nothing running and on keepalive timeouts.
+        """
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self.STATUS_CHANNEL.format(user_id=user_id))
+
+        try:
+            task_id = await self.get_user_active_task_id(user_id)
+            snapshot = await self.get_task_status(task_id) if task_id else None
+
+            yield snapshot
+
+            if not snapshot or snapshot["status"] in (TaskStatus.COMPLETED.value, TaskStatus.FAILED.value):
+                return
+
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=keepalive)
+
+                if not message:
+                    yield None
+                    continue
+
+                event = json.loads(message["data"])
+                yield event
+
+                if event["status"] in (TaskStatus.COMPLETED.value, TaskStatus.FAILED.value):
+                    return
+        finally:
+            await pubsub.aclose()
+
     async def start_queue_processor(self) -> None:
         if not self._queue_processor_task or self._queue_processor_task.done():
             self._shutdown = False
+            # Nothing runs yet, so any workspace left on disk belongs to a previous process
+            await asyncio.to_thread(self.workspaces.sweep, self._active_task_ids)
+            await self.render_pool.start()
             self._queue_processor_task = asyncio.create_task(self._continuous_queue_processor())
 
     async def stop_queue_processor(self) -> None:
-        """Stop the continuous queue processor gracefully"""
+        """Stops taking tasks, gives running renders up to drain_timeout seconds to finish, then shuts the workers down.
+
+        Renders still running after that are cancelled without a terminal status. They stay in this
+        instance's processing list, and another instance's reaper re-queues them.
+        """
         self._shutdown = True
         if self._queue_processor_task and not self._queue_processor_task.done():
+            # Between tasks the processor only waits, on a worker slot, admission or the queue signal, so cancelling it loses nothing
+            self._queue_processor_task.cancel()
             try:
-                await asyncio.wait_for(self._queue_processor_task, timeout=10)
-            except asyncio.TimeoutError:
-                self._queue_processor_task.cancel()
-        
-        # Shutdown executor
-        self.executor.shutdown(wait=True)
+                await self._queue_processor_task
+            except asyncio.CancelledError:
+                pass
 
-    async def submit_task(self, user_id: str, chat_id: str, message_id: str, manim_code: str) -> str:
-        if not await self.can_user_submit_task(user_id):
-            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="User already has an active task")
-        
+        if self._running_tasks:
+            logger.info(f"Waiting up to {self.drain_timeout}s for {len(self._running_tasks)} running tasks to finish")
+            _, pending = await asyncio.wait(list(self._running_tasks), timeout=self.drain_timeout)
+
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+            if pending:
+                logger.warning(f"Left {len(pending)} unfinished tasks for another instance to re-queue")
+
+        # Heartbeats run until the drain is over, so no other instance takes over a render that is about to finish
+        if self._heartbeat_task and not self._heartbeat_task.done():
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+
+        try:
+            # Without the alive key, the reaper re-queues what is left right away instead of after the visibility timeout
+            await self.redis.delete(self.INSTANCE_ALIVE_KEY.format(instance_id=self.instance_id))
+        except Exception as e:
+            logger.error(f"Failed to deregister instance {self.instance_id}: {str(e)}")
+
+        await self.video_writes.close()
+        await self.render_pool.close()
+
+    async def close(self) -> None:
+        await self.stop_queue_processor()
+        await self.storage.close()
+        await self.redis.aclose()
+
+    async def submit_task(self, user_id: str, chat_id: str, message_id: str, manim_code: str, tier: str = 'free') -> str:
         task_id = str(uuid.uuid4())
         task_info = TaskInfo(
             id=task_id,
@@ -155,12 +511,16 @@ class RedisTaskManager:
             status=TaskStatus.QUEUED,
             instance_id=self.instance_id,
             created_at=time.time(),
+            phase=RenderPhase.PREVIEW if self.preview_enabled else RenderPhase.FINAL,
+            tier=tier,
         )
 
         task_key = self.TASK_KEY.format(task_id=task_id)
         task_dict = asdict(task_info)
     
         task_dict["status"] = task_dict["status"].value  # Convert enum to string
+        task_dict["phase"] = task_dict["phase"].value
+        task_dict["priority"] = task_dict["priority"].value
         task_dict["manim_code"] = manim_code
 
         del task_dict["started_at"]
@@ -168,18 +528,31 @@ class RedisTaskManager:
         del task_dict["result"]
         del task_dict["error"]
 
-        await self.redis.hset(task_key, mapping=task_dict)
-        await self.redis.expire(task_key, 60 * 60 * 24)  # 24 hours expiration
-
-        await self.redis.set(
-            self.USER_ACTIVE_TASK.format(user_id=user_id),
-            task_id,
-            ex=60*60*24
+        fields = [str(item) for pair in task_dict.items() for item in pair]
+        submitted = await self._submit_script(
+            keys=[
+                self.USER_ACTIVE_TASK.format(user_id=user_id),
+                task_key,
+                self.QUEUE_KEY,
+                self.VCLOCK_KEY,
+                self.USER_FINISH_KEY.format(user_id=user_id),
+                self.QUEUE_SIGNAL_KEY
+            ],
+            args=[
+                task_id,
+                60 * 60 * 24,  # 24 hours expiration
+                self.STATUS_CHANNEL.format(user_id=user_id),
+                self._status_event(task_id, task_dict, {"status": TaskStatus.QUEUED.value}),
+                task_info.priority.value,
+                self.tier_weights.get(tier, 1),
+                *fields
+            ]
         )
 
-        await self.redis.lpush(self.QUEUE_KEY, task_id)
-        
-        if not self._queue_processor_task or self._queue_processor_task.done():
+        if not submitted:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="User already has an active task")
+
+        if not self._shutdown and (not self._queue_processor_task or self._queue_processor_task.done()):
             self._queue_processor_task = asyncio.create_task(self._continuous_queue_processor())
         
         logger.info(f"Task {task_id} submitted by user {user_id}")
@@ -187,80 +560,259 @@ class RedisTaskManager:
 
     async def _continuous_queue_processor(self) -> None:
         logger.info(f"Starting continuous queue processor on {self.instance_id}")
+        processing_key = self.PROCESSING_KEY.format(instance_id=self.instance_id)
 
-        while not self._shutdown:
-            try:
-                if self.semaphore.locked():
-                    # All workers busy, wait a bit
-                    await asyncio.sleep(1)
-                    continue
-
-                result = await self.redis.brpop(self.QUEUE_KEY, timeout=1)
+        await self.redis.sadd(self.INSTANCES_KEY, self.instance_id)
+        # Owned by stop_queue_processor, which keeps it running while renders drain
+        if not self._heartbeat_task or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
 
-                if result:
-                    _, task_id = result
-                    asyncio.create_task(self._process_single_task_with_semaphore(task_id))
+        while not self._shutdown:
+            # Only pull from the queue once there is a free worker, so a finished
+            # render wakes the processor immediately instead of on the next poll
+            await self.semaphore.acquire()
 
+            try:
+                # Then only once the box has the CPU and memory for another render
+                await self.admission.admit(lambda: len(self._active_task_ids))
+                await self.workspaces.wait_for_space(self._active_task_ids)
+                task_id = await self._next_task(processing_key)
+            except asyncio.CancelledError:
+                self.semaphore.release()
+                raise
             except Exception as e:
+                self.semaphore.release()
                 logger.error(f"Error in continuous queue processor: {str(e)}")
                 await asyncio.sleep(5)  # Wait before retrying
-                
+                continue
+
+            task = asyncio.create_task(self._process_single_task_with_semaphore(task_id))
+            self._running_tasks.add(task)
+            task.add_done_callback(self._running_tasks.discard)
+
+    async def _next_task(self, processing_key: str) -> str:
+        """Waits for the next scheduled task and moves it to this instance's processing list."""
+        woken = False
+
+        while True:
+            task_id = await self._dequeue_script(
+                keys=[self.QUEUE_KEY, processing_key, self.VCLOCK_KEY, self.QUEUE_SIGNAL_KEY, self.BACKGROUND_SINCE_KEY],
+                args=[0 if woken else 1, time.time() - self.background_max_wait if self.background_max_wait > 0 else '-inf']
+            )
+            if task_id:
+                return task_id
+
+            # Blocks until the next enqueue. A token whose task another instance took first
+            # only costs one empty dequeue before blocking again
+            await self.redis.blpop([self.QUEUE_SIGNAL_KEY], timeout=0)
+            woken = True
 
     async def _process_single_task_with_semaphore(self, task_id: str) -> None:
-        async with self.semaphore:
-            await self._process_single_task(task_id)
-        
-    async def _process_single_task(self, task_id: str) -> None:
+        """Runs a dequeued task and gives back the slot the processor acquired for it."""
+        self._active_task_ids.add(task_id)
+        started_at = time.time()
+        requeue = None
+        try:
+            requeue = await self._process_single_task(task_id)
+        finally:
+            await self.workspaces.remove(task_id)
+            self._active_task_ids.discard(task_id)
+            self.semaphore.release()
+
+            try:
+                # Feeds the start time estimates of queued tasks
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.hincrby(self.STATS_KEY, "tasks", 1)
+                    pipe.hincrbyfloat(self.STATS_KEY, "task_seconds", time.time() - started_at)
+                    await pipe.execute()
+            except Exception as e:
+                logger.error(f"Failed to record task stats: {str(e)}")
+
+        # Only once this run no longer owns the task id, so the next run (possibly on this
+        # instance) gets its own heartbeats and workspace
+        if requeue:
+            try:
+                await self._requeue_final(task_id, *requeue)
+            except Exception as e:
+                # Still in the processing list without heartbeats, so the reaper re-queues it
+                logger.error(f"Failed to re-queue task {task_id} for its full render: {str(e)}")
+
+    # ---------------------------------------------------------------------------------
+    # Reliable queue
+    # ---------------------------------------------------------------------------------
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            try:
+                now = time.time()
+
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.set(self.INSTANCE_ALIVE_KEY.format(instance_id=self.instance_id), now, ex=self.visibility_timeout)
+                    for task_id in self._active_task_ids:
+                        pipe.hset(self.TASK_KEY.format(task_id=task_id), "heartbeat_at", now)
+                    await pipe.execute()
+
+                await self.reap_orphaned_tasks()
+
+                if self.tex_cache:
+                    await asyncio.to_thread(self.tex_cache.evict)
+
+                # Leaked workspaces, e.g. from a task cancelled mid-cleanup
+                await asyncio.to_thread(self.workspaces.sweep, set(self._active_task_ids), 60 * 60)
+
+            except Exception as e:
+                logger.error(f"Error in heartbeat loop: {str(e)}")
+
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def reap_orphaned_tasks(self) -> None:
+        """Recovers tasks left in the processing list of a dead instance or with a stale heartbeat."""
+        now = time.time()
+
+        for instance_id in await self.redis.smembers(self.INSTANCES_KEY):
+            processing_key = self.PROCESSING_KEY.format(instance_id=instance_id)
+            alive = await self.redis.exists(self.INSTANCE_ALIVE_KEY.format(instance_id=instance_id))
+            task_ids = await self.redis.lrange(processing_key, 0, -1)
+
+            if not task_ids:
+                if not alive:
+                    await self.redis.srem(self.INSTANCES_KEY, instance_id)
+                continue
+
+            for task_id in task_ids:
+                heartbeat_at = await self.redis.hget(self.TASK_KEY.format(task_id=task_id), "heartbeat_at")
+                stale = heartbeat_at is not None and now - float(heartbeat_at) > self.visibility_timeout
+
+                if not alive or stale:
+                    await self._recover_task(processing_key, task_id)
+
+    async def _recover_task(self, processing_key: str, task_id: str) -> None:
+        task_key = self.TASK_KEY.format(task_id=task_id)
+        task_info = await self.redis.hgetall(task_key)
+
+        if not task_info or task_info["status"] in (TaskStatus.COMPLETED.value, TaskStatus.FAILED.value):
+            # Finished (or expired) before the owner could clean up its processing list
+            await self.redis.lrem(processing_key, 1, task_id)
+            return
+
+        attempts = int(task_info.get("attempts", 0)) + 1
+
+        if attempts < self.max_attempts:
+            requeued = await self._requeue_script(
+                keys=[processing_key, self.QUEUE_KEY, task_key, self.VCLOCK_KEY, self.QUEUE_SIGNAL_KEY],
+                args=[
+                    task_id,
+                    TaskStatus.QUEUED.value,
+                    attempts,
+                    self.STATUS_CHANNEL.format(user_id=task_info["user_id"]),
+                    self._status_event(task_id, task_info, {"status": TaskStatus.QUEUED.value}),
+                    task_info.get("priority", TaskPriority.INTERACTIVE.value)
+                ]
+            )
+            if requeued:
+                logger.warning(f"Re-queued orphaned task {task_id} (attempt {attempts + 1})")
+            return
+
+        if await self.redis.lrem(processing_key, 1, task_id):
+            await self._finish_task(task_id, task_info, {
+                "status": TaskStatus.FAILED.value,
+                "completed_at": time.time(),
+                "attempts": attempts,
+                "error": "Video generation was interrupted"
+            })
+            logger.warning(f"Failed orphaned task {task_id} after {attempts} attempts")
+
+    async def _process_single_task(self, task_id: str) -> Optional[Tuple[dict, dict]]:
+        """Returns (task_info, mapping) when the task still needs its full render, for _requeue_final."""
         task_key = self.TASK_KEY.format(task_id=task_id)
         task_info = await self.redis.hgetall(task_key)
 
         if not task_info:
             logger.error(f"Task {task_id} not found in Redis")
+            await self.redis.lrem(self.PROCESSING_KEY.format(instance_id=self.instance_id), 1, task_id)
             return
 
         logger.info(f"Processing task with info {task_info}")
+        user_id = task_info["user_id"]
         
         try:
-            await self.redis.hset(task_key, mapping={
+            processing = {
                 "status": TaskStatus.PROCESSING.value,
                 "started_at": time.time(),
-                "processing_instance": self.instance_id
-            })
+                "heartbeat_at": time.time(),
+                "processing_instance": self.instance_id,
+                **self.render_limits.describe()
+            }
+
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(task_key, mapping=processing)
+                pipe.publish(self.STATUS_CHANNEL.format(user_id=user_id), self._status_event(task_id, task_info, processing))
+                await pipe.execute()
+
+            cache_key = self.render_cache.key_for(task_info["manim_code"])
+            cached = await self.render_cache.get(cache_key) if cache_key else None
+
+            if cached:
+                s3_bucket, s3_key = cached
+                logger.info(f"Render cache hit for task {task_id}, reusing {s3_key}")
+
+                await self.add_video_to_db(task_info["chat_id"], task_info["message_id"], user_id, s3_bucket, s3_key)
+                await self._finish_task(task_id, task_info, {
+                    "status": TaskStatus.COMPLETED.value,
+                    "completed_at": time.time(),
+                    "result": s3_key,
+                    "cached": 1
+                })
+                return
+
+            if task_info.get("phase") == RenderPhase.PREVIEW.value:
+                if final := await self._process_preview(task_id, task_info):
+                    return task_info, final
+                return
 
             success, path_or_error = await self.run_manim_generation(
                 task_id=task_id, 
                 manim_code=task_info["manim_code"],
-                output_dir=f"{os.getcwd()}/output/{task_id}"
+                output_dir=self.workspaces.create(task_id)
             )
             
             if success:
-                user_id = task_info["user_id"]
                 chat_id = task_info["chat_id"]
                 message_id = task_info["message_id"]
 
                 s3_bucket = config['AWS_S3_BUCKET']
                 s3_key = f"videos/{user_id}/{chat_id}/{message_id}.mp4"
-                s3_region = config['AWS_BUCKET_REGION']
 
-                success, output = await self.upload_video_to_s3(path_or_error, s3_bucket, s3_region, s3_key)
+                # Straight from the render directory, the mp4 is final once manim returns
+                success, output, upload_metrics = await self.upload_video_to_s3(path_or_error, s3_bucket, s3_key)
 
                 if success:
-                    logger.info(f"Video uploaded to S3 at {s3_key}")
+                    logger.info(f"Video uploaded to S3 at {s3_key} ({upload_metrics['upload_bytes']} bytes, {upload_metrics['upload_mbps']} Mbps)")
                     await self.add_video_to_db(chat_id, message_id, user_id, s3_bucket, s3_key)
+
+                    if cache_key:
+                        await self.render_cache.put(cache_key, s3_bucket, s3_key)
                 else:
                     logger.error(f"Failed to upload video to S3: {output}")
 
-                await self.redis.hset(task_key, mapping={
+                await self._finish_task(task_id, task_info, {
                     "status": TaskStatus.COMPLETED.value,
                     "completed_at": time.time(),
-                    "result": path_or_error
+                    "result": path_or_error,
+                    **upload_metrics
+                })
+            elif task_info.get("preview_s3_key"):
+                # The full render failed but the preview made it, so the user still gets a video
+                logger.error(f"Full render failed for task {task_id}, keeping the preview: {path_or_error}")
+                await self.add_video_to_db(task_info["chat_id"], task_info["message_id"], user_id, task_info["preview_s3_bucket"], task_info["preview_s3_key"])
+                await self._finish_task(task_id, task_info, {
+                    "status": TaskStatus.COMPLETED.value,
+                    "completed_at": time.time(),
+                    "result": task_info["preview_s3_key"],
+                    "error": path_or_error
                 })
-
-                # Delete video from local storage
-                if os.path.exists(path_or_error):
-                    os.remove(path_or_error)
             else:
-                await self.redis.hset(task_key, mapping={
+                await self._finish_task(task_id, task_info, {
                     "status": TaskStatus.FAILED.value,
                     "completed_at": time.time(),
                     "error": path_or_error
@@ -269,73 +821,224 @@ class RedisTaskManager:
             logger.info(f"Task {task_id} finished")
         except Exception as e:
             logger.error(f"Error processing task {task_id}: {str(e)}")
-            await self.redis.hset(task_key, mapping={
+            await self._finish_task(task_id, task_info, {
                 "status": TaskStatus.FAILED.value,
                 "completed_at": time.time(),
                 "error": str(e)
             })
         finally:
-            user_id = task_info["user_id"]
-            await self.redis.delete(self.USER_ACTIVE_TASK.format(user_id=user_id))
+            if task_id in self._settled_task_ids:
+                self._settled_task_ids.discard(task_id)
+            elif not self._shutdown:
+                # Cancelled, or the terminal write itself failed: don't keep the user locked out until the
+                # reaper gets to it. A shutdown keeps the slot, the task is re-queued rather than finished
+                try:
+                    await self._release_script(keys=[self.USER_ACTIVE_TASK.format(user_id=user_id)], args=[task_id])
+                except Exception as e:
+                    logger.error(f"Failed to release the active task of user {user_id}: {str(e)}")
+
+    async def _process_preview(self, task_id: str, task_info: dict) -> Optional[dict]:
+        """Renders and uploads the low quality preview. Returns the mapping to re-queue the task with for the full render, None if it failed."""
+        user_id = task_info["user_id"]
+        s3_bucket = config['AWS_S3_BUCKET']
+
+        cache_key = self.render_cache.key_for(task_info["manim_code"], self.PREVIEW_CONFIG)
+        cached = await self.render_cache.get(cache_key) if cache_key else None
+
+        if cached:
+            s3_bucket, s3_key = cached
+        else:
+            success, path_or_error = await self.run_manim_generation(
+                task_id=task_id,
+                manim_code=task_info["manim_code"],
+                output_dir=f"{self.workspaces.create(task_id)}/preview",
+                render_config=self.PREVIEW_CONFIG
+            )
+
+            if not success:
+                # Same code at a higher resolution would fail the same way
+                await self._finish_task(task_id, task_info, {
+                    "status": TaskStatus.FAILED.value,
+                    "completed_at": time.time(),
+                    "error": path_or_error
+                })
+                return None
+
+            s3_key = f"videos/{user_id}/{task_info['chat_id']}/{task_info['message_id']}.preview.mp4"
+            success, output, _ = await self.upload_video_to_s3(path_or_error, s3_bucket, s3_key)
+
+            if success and cache_key:
+                await self.render_cache.put(cache_key, s3_bucket, s3_key)
+            elif not success:
+                logger.error(f"Failed to upload preview to S3: {output}")
+                s3_key = None
+
+        final = {"status": TaskStatus.QUEUED.value, "phase": RenderPhase.FINAL.value, "priority": TaskPriority.BACKGROUND.value}
+
+        if s3_key:
+            final["preview_s3_bucket"] = s3_bucket
+            final["preview_s3_key"] = s3_key
+            final["preview_url"] = await self.get_video_url_aws(f"preview-{task_id}", s3_bucket, s3_key, expiry=3600)
+
+        # Keeps the user's slot, the task isn't finished
+        self._settled_task_ids.add(task_id)
+        return final
+
+    async def _requeue_final(self, task_id: str, task_info: dict, final: dict) -> None:
+        """Puts a task whose preview is done back in the queue for the full render and publishes the preview."""
+        user_id = task_info["user_id"]
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.TASK_KEY.format(task_id=task_id), mapping=final)
+            pipe.hdel(self.TASK_KEY.format(task_id=task_id), "heartbeat_at")
+            pipe.lrem(self.PROCESSING_KEY.format(instance_id=self.instance_id), 1, task_id)
+            # Background priority, so the full render only runs when no one is waiting for a first
+            # render, or once it has waited background_max_wait
+            await self._enqueue_script(
+                keys=[self.QUEUE_KEY, self.VCLOCK_KEY, self.USER_FINISH_KEY.format(user_id=user_id), self.QUEUE_SIGNAL_KEY, self.BACKGROUND_SINCE_KEY],
+                args=[task_id, TaskPriority.BACKGROUND.value, self.tier_weights.get(task_info.get("tier", "free"), 1), 60 * 60 * 24, time.time()],
+                client=pipe
+            )
+            pipe.publish(self.STATUS_CHANNEL.format(user_id=user_id), self._status_event(task_id, task_info, final))
+            await pipe.execute()
+
+        logger.info(f"Preview for task {task_id} ready, full render queued")
+
+    async def _finish_task(self, task_id: str, task_info: dict, mapping: dict) -> None:
+        """Writes the terminal status, releases the user's active-task slot and notifies subscribers in one round-trip."""
+        user_id = task_info["user_id"]
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.TASK_KEY.format(task_id=task_id), mapping=mapping)
+            await self._release_script(keys=[self.USER_ACTIVE_TASK.format(user_id=user_id)], args=[task_id], client=pipe)
+            pipe.lrem(self.PROCESSING_KEY.format(instance_id=self.instance_id), 1, task_id)
+            pipe.publish(self.STATUS_CHANNEL.format(user_id=user_id), self._status_event(task_id, task_info, mapping))
+            await pipe.execute()
+
+        if task_id in self._active_task_ids:
+            self._settled_task_ids.add(task_id)
+
+    @staticmethod
+    def _status_event(task_id: str, task_info: dict, mapping: dict) -> str:
+        return json.dumps({
+            "task_id": task_id,
+            "user_id": task_info["user_id"],
+            "chat_id": task_info["chat_id"],
+            "message_id": task_info["message_id"],
+            **mapping
+        })
     
-    async def run_manim_generation(self, task_id: str, manim_code: str, output_dir: str) -> Tuple[bool, str]:
-        """main.py file is created in output_dir. The video is generated in output_dir/media/videos/1080p60/."""
+    async def run_manim_generation(self, task_id: str, manim_code: str, output_dir: str, render_config: Optional[dict] = None) -> Tuple[bool, str]:
+        """main.py file is created in output_dir and rendered on a warm worker. The video is generated in output_dir/media/videos/{quality}/.
+
+        render_config overrides manim config values for this render only, e.g. resolution and frame rate.
+        """
         try:
             os.makedirs(output_dir, exist_ok=True)
 
             with open(f"{output_dir}/main.py", "w") as file:
                 file.write(manim_code)
 
-            cmd = ["python", "main.py"]
+            timeout = 60 * 20     # 20 minutes
 
-            try:
-                process = await asyncio.create_subprocess_exec(
-                    *cmd, 
-                    stdout=asyncio.subprocess.PIPE, 
-                    stderr=asyncio.subprocess.PIPE,
-                    cwd=output_dir 
-                )
+            if self.split_renders and (result := await self._render_in_pieces(task_id, manim_code, output_dir, timeout, render_config)):
+                return result
 
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=60 * 20      # 20 minutes
-                )
+            success, error, kill_reason = await self.render_pool.render(
+                manim_code=manim_code,
+                output_dir=output_dir,
+                timeout=timeout,
+                render_config=render_config
+            )
 
-                if process.returncode == 0 and (path_ := self.get_video_file(f"{output_dir}/media/videos")):
-                    return True, path_.as_posix()
+            if not success:
+                await self._record_kill_reason(task_id, kill_reason)
+                return False, error
 
-                else:
-                    return False, f"Manim execution failed: {stderr.decode()}"
-            
-            except asyncio.TimeoutError:
-                if process.returncode is None:
-                    process.kill()
-                    await process.wait()
+            if path_ := self.get_video_file(f"{output_dir}/media/videos"):
+                return True, path_.as_posix()
 
-                return False, "Video generation timed out after 20 minutes"
+            return False, "Manim execution failed: no video was produced"
         
         except Exception as e:
             return False, str(e)
 
 
+    async def _render_in_pieces(self, task_id: str, manim_code: str, output_dir: str, timeout: float, render_config: Optional[dict]) -> Optional[Tuple[bool, str]]:
+        """Renders each scene, or each section of a scene, on its own worker and joins the videos.
+
+        None when the code can't be split into at least two pieces, the caller then renders it as a whole.
+        """
+        order = scene_render_order(manim_code)
+        if not order:
+            return None
+
+        # The script sets these itself when it runs whole, after render_config is applied
+        scenes, script_config = order
+        render_config = {**(render_config or {}), **script_config}
+
+        sections: dict[str, int] = {}
+        if "next_section" in manim_code:
+            os.makedirs(f"{output_dir}/plan", exist_ok=True)
+            sections = await self.render_pool.plan(manim_code, f"{output_dir}/plan", scenes, timeout, render_config) or {}
+
+        pieces = [
+            (scene, section if sections.get(scene, 1) > 1 else None)
+            for scene in scenes
+            for section in range(sections.get(scene, 1))
+        ]
+        if len(pieces) < 2:
+            return None
+
+        logger.info(f"Rendering task {task_id} as {len(pieces)} pieces")
+
+        piece_dirs = [f"{output_dir}/pieces/{i}" for i in range(len(pieces))]
+        for piece_dir in piece_dirs:
+            os.makedirs(piece_dir, exist_ok=True)
+
+        results = await asyncio.gather(*(
+            self.render_pool.render(manim_code, piece_dir, timeout, render_config, scene=scene, section=section)
+            for piece_dir, (scene, section) in zip(piece_dirs, pieces)
+        ))
+
+        for success, error, kill_reason in results:
+            if not success:
+                await self._record_kill_reason(task_id, kill_reason)
+                return False, error
+
+        # Sections without animations produce no video
+        videos = [video for piece_dir in piece_dirs if (video := self.get_video_file(f"{piece_dir}/media/videos"))]
+        if not videos:
+            return False, "Manim execution failed: no video was produced"
+
+        if len(videos) == 1:
+            return True, videos[0].as_posix()
+
+        return await concat_videos(videos, f"{output_dir}/{task_id}.mp4")
+
+    async def _record_kill_reason(self, task_id: str, kill_reason: Optional[str]) -> None:
+        if kill_reason:
+            logger.warning(f"Render for task {task_id} was stopped: {kill_reason}")
+            await self.redis.hset(self.TASK_KEY.format(task_id=task_id), "kill_reason", kill_reason)
+
     # ---------------------------------------------------------------------------------
     # Video methods
     # ---------------------------------------------------------------------------------
 
-    async def upload_video_to_s3(self, file_path: str, s3_bucket: str, s3_region: str, s3_key: str) -> Tuple[bool, str]:
-        session = aioboto3.Session(
-            aws_access_key_id=config['AWS_ACCESS_KEY_ID'], 
-            aws_secret_access_key=config['AWS_SECRET_ACCESS_KEY']
-        )
+    async def upload_video_to_s3(self, file_path: str, s3_bucket: str, s3_key: str) -> Tuple[bool, str, dict]:
+        try:
+            metrics = await self.storage.upload_file(file_path, s3_bucket, s3_key)
+        except Exception as e:
+            logger.error(f"Error uploading video to S3: {str(e)}")
+            return False, str(e), {}
 
-        async with session.client('s3', region_name=s3_region) as s3_client:
-            try:
-                with open(file_path, 'rb') as data:
-                    await s3_client.upload_fileobj(data, s3_bucket, s3_key)
-                return True, ""
-            except Exception as e:
-                logger.error(f"Error uploading video to S3: {str(e)}")
-                return False, str(e)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hincrby(self.STATS_KEY, "uploads", 1)
+            pipe.hincrby(self.STATS_KEY, "upload_bytes", metrics["upload_bytes"])
+            pipe.hincrbyfloat(self.STATS_KEY, "upload_seconds", metrics["upload_seconds"])
+            await pipe.execute()
+
+        return True, "", metrics
 
     def get_video_file(self, directory: str) -> Optional[Path]:
         video_extensions = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm', '.m4v'}
@@ -354,62 +1057,98 @@ class RedisTaskManager:
         return None
     
     async def add_video_to_db(self, chat_id: str, message_id: str, user_id: str, s3_bucket: str, s3_key: str):
-        async with AsyncSessionLocal() as db:
-            result = await db.execute(
-                select(Message)
-                .where(
-                    Message.id == message_id, 
-                    Message.chat_id == chat_id
-                )
-            )
-            db_message = result.scalar_one_or_none()
+        await self.video_writes.submit(VideoCompletion(chat_id, message_id, user_id, s3_bucket, s3_key))
 
-            if not db_message:
-                logger.error(f"Message {message_id} in chat {chat_id} not found in DB")
-                return
-            
-            try:
-                db_video = Video(
-                    s3_bucket=s3_bucket,
-                    s3_key=s3_key,
+    async def _save_videos(self, completions: list[VideoCompletion]) -> None:
+        """Inserts the videos, links them to their messages and charges for them, all in one transaction."""
+        balances: dict[str, Tuple[int, datetime]] = {}
+
+        try:
+            async with AsyncSessionLocal() as db, db.begin():
+                result = await db.execute(
+                    select(Message.id, Message.chat_id)
+                    .where(Message.id.in_([completion.message_id for completion in completions]))
                 )
+                message_chats = dict(result.all())
+
+                videos = []
+                for completion in completions:
+                    if message_chats.get(completion.message_id) != completion.chat_id:
+                        logger.error(f"Message {completion.message_id} in chat {completion.chat_id} not found in DB")
+                        continue
+
+                    balance = await Credits.deduct(db, completion.user_id, cost=100)
+                    if balance is None:
+                        logger.error(f"Insufficient credits for user {completion.user_id}, video of message {completion.message_id} not saved")
+                        continue
+
+                    balances[completion.user_id] = balance
+                    videos.append((uuid_str(), completion))
+
+                if videos:
+                    await db.execute(
+                        insert(Video),
+                        [{"id": video_id, "s3_bucket": completion.s3_bucket, "s3_key": completion.s3_key} for video_id, completion in videos]
+                    )
+                    await db.execute(
+                        update(Message),
+                        [{"id": completion.message_id, "video_id": video_id} for video_id, completion in videos]
+                    )
+        except Exception as e:
+            logger.error(f"Error saving videos for messages {[completion.message_id for completion in completions]}: {str(e)}")
+            return
 
-                db.add(db_video)
+        for user_id, balance in balances.items():
+            await self.credits_cache.put(user_id, *balance)
 
-                result = await db.execute(select(Credits).where(Credits.user_id == user_id))
-                db_credits = result.scalar_one_or_none()
-                
-                await db_credits.deduct_credits(db, cost=100)
+    async def get_video_url_aws(self, video_id: str, s3_bucket: str, s3_key: str, expiry: int) -> Optional[str]:
+        video_urls = await self.get_video_urls_aws([(video_id, s3_bucket, s3_key)], expiry=expiry)
+        return video_urls.get(video_id)
 
-                await db.commit()
-                await db.refresh(db_video)
+    async def get_video_urls_aws(self, videos: list[Tuple[str, str, str]], expiry: int) -> dict[str, str]:
+        """Presigned URLs for (video_id, s3_bucket, s3_key) triples.
 
-                db_message.video_id = db_video.id
-                await db.commit()
+        Looks in the in-process cache, then fetches the rest from Redis in one round-trip and signs only what's left.
+        """
+        video_urls: dict[str, str] = {}
 
-            except Exception as e:
-                await db.rollback()
-                logger.error(f"Error updating message with video ID: {str(e)}")
+        for video_id, _, _ in videos:
+            if video_url := self._video_url_cache.get(video_id):
+                video_urls[video_id] = video_url
 
-    async def get_video_url_aws(self, video_id: str, s3_bucket: str, s3_key: str, expiry: int) -> Optional[str]:
-        # Check cache
-        video_url = await self.redis.get(self.VIDEO_KEY.format(video_id=video_id))
+        remaining = [video for video in videos if video[0] not in video_urls]
+        if not remaining:
+            return video_urls
 
-        if video_url: 
-            return video_url
+        # Check cache. The Redis TTL already stops PRESIGN_MARGIN short of the URL's expiry, so a
+        # local copy that lives no longer than what is left of it is always good for the margin
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for video_id, _, _ in remaining:
+                pipe.get(self.VIDEO_KEY.format(video_id=video_id))
+                pipe.pttl(self.VIDEO_KEY.format(video_id=video_id))
+            cached = await pipe.execute()
 
-        session = aioboto3.Session(
-            aws_access_key_id=config['AWS_ACCESS_KEY_ID'], 
-            aws_secret_access_key=config['AWS_SECRET_ACCESS_KEY']
-        )
+        for (video_id, _, _), video_url, pttl in zip(remaining, cached[::2], cached[1::2]):
+            if video_url:
+                video_urls[video_id] = video_url
+                if pttl > 0:
+                    self._video_url_cache.set(video_id, video_url, ttl=pttl / 1000)
 
-        async with session.client("s3", region_name=config['AWS_BUCKET_REGION']) as s3_client:
-            presigned_url = await s3_client.generate_presigned_url(
-                "get_object",
-                Params={"Bucket": s3_bucket, "Key": s3_key},
-                ExpiresIn=expiry if expiry >= 3600 else 3600
-            )
+        misses = [video for video in remaining if video[0] not in video_urls]
+        if not misses:
+            return video_urls
+
+        expires_in = max(expiry, 3600)
+        cache_ttl = expires_in - self.PRESIGN_MARGIN
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for video_id, s3_bucket, s3_key in misses:
+                presigned_url = await self.storage.presign_get(s3_bucket, s3_key, expires_in=expires_in)
+
+                video_urls[video_id] = presigned_url
+                self._video_url_cache.set(video_id, presigned_url, ttl=cache_ttl)
+                pipe.set(self.VIDEO_KEY.format(video_id=video_id), presigned_url, ex=cache_ttl)
 
-            await self.redis.set(self.VIDEO_KEY.format(video_id=video_id), presigned_url, ex=expiry - 300)
+            await pipe.execute()
 
-            return presigned_url
+        return video_urls
@@ -0,0 +1,63 @@
+import logging
+import os
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class TexCache:
+    """Keeps the LaTeX SVG cache the render workers share under `max_bytes`.
+
+    Workers publish SVGs with an atomic rename and touch them on every hit, so the
+    mtime is the last use. Eviction deletes the least recently used files, except
+    ones used in the last `grace_seconds` that a render may be about to read.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, grace_seconds: float = 600, min_interval: float = 300):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.grace_seconds = grace_seconds
+        self.min_interval = min_interval
+
+        self._evicted_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def evict(self, force: bool = False) -> int:
+        """Brings the cache down to 90% of `max_bytes`. Returns the bytes freed. Runs at most every `min_interval` seconds."""
+        if not force and time.monotonic() - self._evicted_at < self.min_interval:
+            return 0
+
+        self._evicted_at = time.monotonic()
+        entries = []
+
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return 0
+
+        target = self.max_bytes * 0.9
+        cutoff = time.time() - self.grace_seconds
+        freed = 0
+
+        # Several instances may evict the same directory, so files can vanish under us
+        for mtime, size, path in sorted(entries):
+            if total - freed <= target or mtime > cutoff:
+                break
+
+            try:
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                continue
+
+        logger.info(f"Evicted {freed // 1024} KB from the Tex cache ({(total - freed) // 1024} KB left)")
+        return freed
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+from typing import Iterable, Optional
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+
+def _is_task_id(name: str) -> bool:
+    try:
+        uuid.UUID(name)
+    except ValueError:
+        return False
+    return True
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(root, filename)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+class WorkspaceManager:
+    """Render directories, one per task, under a disk budget.
+
+    A workspace goes on `scratch_root` (e.g. a tmpfs like /dev/shm) while it has at least
+    `scratch_min_free_bytes` free, otherwise on `root`. Either way it lives in a SUBDIR
+    of its own, so `sweep`, which clears the workspaces nobody owns anymore, never
+    touches anything else there. Workspaces are removed when their task is done,
+    whatever the outcome.
+    """
+
+    SUBDIR = "manim-workspaces"
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int,
+        scratch_root: str = "",
+        scratch_min_free_bytes: int = 2 * 1024 * 1024 * 1024,
+        check_interval: float = 5,
+    ):
+        self.root = os.path.join(root, self.SUBDIR)
+        self.scratch_root = os.path.join(scratch_root, self.SUBDIR) if scratch_root else ""
+        self.roots = [path for path in (self.scratch_root, self.root) if path]
+        self.max_bytes = max_bytes
+        self.scratch_min_free_bytes = scratch_min_free_bytes
+        self.check_interval = check_interval
+
+        self._paths: dict[str, str] = {}
+
+        for path in self.roots:
+            os.makedirs(path, exist_ok=True)
+
+    def create(self, task_id: str) -> str:
+        if task_id in self._paths:
+            return self._paths[task_id]
+
+        root = self.root
+        if self.scratch_root and shutil.disk_usage(self.scratch_root).free >= self.scratch_min_free_bytes:
+            root = self.scratch_root
+
+        path = os.path.join(root, task_id)
+        os.makedirs(path, exist_ok=True)
+        self._paths[task_id] = path
+        return path
+
+    async def remove(self, task_id: str) -> None:
+        path = self._paths.pop(task_id, None)
+        if path:
+            await asyncio.to_thread(shutil.rmtree, path, ignore_errors=True)
+
+    def usage(self) -> int:
+        return sum(_tree_size(os.path.join(root, name)) for root in self.roots for name in os.listdir(root))
+
+    def sweep(self, active: Iterable[str], min_age: float = 0) -> int:
+        """Deletes workspaces of tasks not in `active` that are at least `min_age` seconds old. Returns how many."""
+        active = set(active)
+        removed = 0
+
+        for root in self.roots:
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                if name in active or not _is_task_id(name) or not os.path.isdir(path):
+                    continue
+
+                try:
+                    if time.time() - os.stat(path).st_mtime < min_age:
+                        continue
+                except FileNotFoundError:
+                    continue
+
+                shutil.rmtree(path, ignore_errors=True)
+                self._paths.pop(name, None)
+                removed += 1
+
+        if removed:
+            logger.info(f"Removed {removed} orphaned render workspaces")
+
+        return removed
+
+    async def wait_for_space(self, active: Iterable[str]) -> None:
+        """Blocks while the workspaces use more than the budget, sweeping orphans first."""
+        logged_at: Optional[float] = None
+
+        while (usage := await asyncio.to_thread(self.usage)) > self.max_bytes:
+            if await asyncio.to_thread(self.sweep, active):
+                continue
+
+            if logged_at is None or time.monotonic() - logged_at > 60:
+                logged_at = time.monotonic()
+                logger.warning(f"Render workspaces use {usage // (1024 * 1024)} MB, over the {self.max_bytes // (1024 * 1024)} MB budget, waiting")
+
+            await asyncio.sleep(self.check_interval)
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+class WriteBatcher(Generic[T]):
+    """Coalesces writes that arrive close together into one call of `write`.
+
+    A batch goes out once it holds `max_size` items or `max_delay` seconds after its
+    first item, whichever comes first. `submit` returns when the batch holding the
+    item has been written, and raises if that write failed. With `max_size` 1 every
+    item is written on its own, straight away.
+    """
+
+    def __init__(self, write: Callable[[list[T]], Awaitable[None]], max_size: int = 1, max_delay: float = 0.05):
+        self.write = write
+        self.max_size = max(1, max_size)
+        self.max_delay = max_delay
+
+        self._pending: list[tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+
+        await future
+
+    async def close(self) -> None:
+        """Writes whatever is pending and waits for writes in flight."""
+        self._flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _flush(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: list[tuple[T, asyncio.Future]]) -> None:
+        try:
+            await self.write([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
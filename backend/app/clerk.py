@@ -1,37 +1,147 @@
 import asyncio
+import hashlib
+import httpx
+import logging
+from jose import jwt, JWTError
+from jose.exceptions import JOSEError
+import time
+from typing import Optional
 from fastapi import HTTPException, Depends, status, Request, WebSocket
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.cache import TTLCache
 from app.config import config
 from app.schemas import TokenData, DummyRequest
 
 from clerk_backend_api import Clerk
-from clerk_backend_api.security.types import AuthenticateRequestOptions, RequestState
 
 from app.database.core import get_db_async
 from app.database.models import User, Credits
 
 
-def verify(req: Request | WebSocket) -> RequestState:
-    sdk = Clerk(
-        bearer_auth=config['CLERK_SECRET_KEY'],
-    )
-    request_state = sdk.authenticate_request(
-        req,
-        AuthenticateRequestOptions(
-            authorized_parties=[config['FRONTEND_URL'] or 'http://localhost:3000'],
-        )
-    )
+logger = logging.getLogger(__name__)
+
+class ClerkJWTVerifier:
+    """Verifies Clerk session tokens locally against a cached JWKS.
+
+    The JWKS is fetched once and refreshed every `jwks_ttl` seconds, or early when a
+    token is signed with a key id we haven't seen (Clerk rotated its keys). If a refresh
+    fails the last good keys stay in use, and the fetch is retried after `retry_interval`.
+    """
+
+    JWKS_URL = "https://api.clerk.com/v1/jwks"
+
+    def __init__(self, secret_key: str, authorized_parties: list[str], jwks_ttl: int = 3600, leeway: int = 5, retry_interval: float = 30):
+        self.secret_key = secret_key
+        self.authorized_parties = authorized_parties
+        self.jwks_ttl = jwks_ttl
+        self.leeway = leeway
+        self.retry_interval = retry_interval
+
+        self._keys: dict[str, dict] = {}
+        self._fetched_at = 0.0
+        self._retry_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _refresh_jwks(self, force: bool = False) -> None:
+        async with self._lock:
+            # Another request may have refreshed while we waited on the lock
+            now = time.monotonic()
+            if self._keys and now - self._fetched_at < (60 if force else self.jwks_ttl):
+                return
+
+            # A failed fetch isn't retried by every request while Clerk is down
+            if now < self._retry_at:
+                return
+
+            try:
+                async with httpx.AsyncClient(timeout=10) as client:
+                    response = await client.get(self.JWKS_URL, headers={"Authorization": f"Bearer {self.secret_key}"})
+                    response.raise_for_status()
+
+                keys = {key["kid"]: key for key in response.json().get("keys", [])}
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                self._retry_at = now + self.retry_interval
+                logger.error(f"Failed to refresh the Clerk JWKS, {'keeping the cached keys' if self._keys else 'no keys cached'}: {str(e)}")
+                return
+
+            self._keys = keys
+            self._fetched_at = now
+
+    async def _get_key(self, kid: str) -> Optional[dict]:
+        if time.monotonic() - self._fetched_at >= self.jwks_ttl:
+            await self._refresh_jwks()
+
+        if kid not in self._keys:
+            await self._refresh_jwks(force=True)
+
+        if not self._keys:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is temporarily unavailable"
+            )
+
+        return self._keys.get(kid)
+
+    async def verify(self, token: str) -> dict:
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            key = await self._get_key(kid) if kid else None
+
+            if not key:
+                raise JWTError("Unknown signing key")
+
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[key.get("alg", "RS256")],
+                options={"verify_aud": False, "leeway": self.leeway},
+            )
+        except JOSEError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Unauthorized: Invalid or missing token"
+            )
+
+        azp = claims.get("azp")
+        if azp and azp not in self.authorized_parties:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Unauthorized: Invalid or missing token"
+            )
+
+        return claims
+
+
+jwt_verifier = ClerkJWTVerifier(
+    secret_key=config['CLERK_SECRET_KEY'],
+    authorized_parties=[config['FRONTEND_URL'] or 'http://localhost:3000'],
+    jwks_ttl=int(config.get('CLERK_JWKS_TTL', 3600)),
+)
+
+# Verified tokens, keyed by hash, so repeat requests skip both verification and the user lookup
+token_cache = TTLCache(
+    maxsize=int(config.get('AUTH_TOKEN_CACHE_SIZE', 10000)),
+    ttl=int(config.get('AUTH_TOKEN_CACHE_TTL', 60)),
+)
+
+
+def get_session_token(req: Request | WebSocket | DummyRequest) -> Optional[str]:
+    authorization = req.headers.get("Authorization") or req.headers.get("authorization")
+    if authorization and authorization.startswith("Bearer "):
+        return authorization[len("Bearer "):]
+
+    cookies = getattr(req, "cookies", None) or {}
+    return cookies.get("__session")
 
-    return request_state
 
 async def get_current_user(request: Request, db: AsyncSession = Depends(get_db_async)):
     token_data = await verify_user_and_return_user_data(request, db)
     print("authenticated")
     return token_data
-    
+
 async def get_current_user_ws(ws: WebSocket, db: AsyncSession = Depends(get_db_async)):
     token_data = await verify_user_and_return_user_data(ws, db)
     return token_data
@@ -41,21 +151,20 @@ async def get_current_user_ws_dummy(dummy_request: DummyRequest, db: AsyncSessio
     return token_data
 
 async def verify_user_and_return_user_data(req: Request | WebSocket | DummyRequest, db: AsyncSession):
-    loop = asyncio.get_running_loop()
-
-    if not loop or not loop.is_running():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-         
-    request_state = await loop.run_in_executor(None, verify, req)
+    token = get_session_token(req)
 
-    if not request_state.is_signed_in:
+    if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Unauthorized: Invalid or missing token"
         )
 
-    user_id = request_state.payload.get('sub')
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    if token_data := token_cache.get(token_hash):
+        return token_data
+
+    claims = await jwt_verifier.verify(token)
+    user_id = claims.get('sub')
 
     result = await db.execute(select(User).where(User.id == user_id))
 
@@ -64,7 +173,7 @@ async def verify_user_and_return_user_data(req: Request | WebSocket | DummyReque
 
     if not user:
         async with Clerk(bearer_auth=config['CLERK_SECRET_KEY']) as clerk:
-            clerk_user = await clerk.users.get_async(user_id=request_state.payload.get('sub'))
+            clerk_user = await clerk.users.get_async(user_id=user_id)
             email = clerk_user.email_addresses[0].email_address if clerk_user.email_addresses else None
 
             if not email:
@@ -72,7 +181,7 @@ async def verify_user_and_return_user_data(req: Request | WebSocket | DummyReque
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="User email not found"
                 )
-                
+
         user = User(id=user_id, email=email)
         credits = Credits(user_id=user_id, amount=500)
 
@@ -83,4 +192,7 @@ async def verify_user_and_return_user_data(req: Request | WebSocket | DummyReque
         await db.commit()
         await db.refresh(user)
 
-    return TokenData(user_id=user_id, email=email)
+    token_data = TokenData(user_id=user_id, email=email)
+    token_cache.set(token_hash, token_data, ttl=claims.get('exp', 0) - time.time())
+
+    return token_data
@@ -5,7 +5,15 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 
 from typing import AsyncGenerator
 
-async_engine = create_async_engine(config['ASYNC_DB_URI'])
+async_engine = create_async_engine(
+    config['ASYNC_DB_URI'],
+    pool_size=int(config.get('DB_POOL_SIZE', 10)),
+    max_overflow=int(config.get('DB_MAX_OVERFLOW', 10)),
+    pool_timeout=float(config.get('DB_POOL_TIMEOUT', 30)),
+    # Connections older than this are replaced, before the server or a proxy drops them
+    pool_recycle=int(config.get('DB_POOL_RECYCLE', 1800)),
+    pool_pre_ping=config.get('DB_POOL_PRE_PING', 'TRUE') == 'TRUE',
+)
 AsyncSessionLocal = async_sessionmaker(
     bind=async_engine,
     class_=AsyncSession,
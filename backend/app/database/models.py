@@ -1,13 +1,13 @@
 from .core import Base
 
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index, case, or_, select, update
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship, Mapped
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 
-from typing import List
+from typing import List, Optional, Tuple
 from uuid import uuid4
 
 def uuid_str() -> str:
@@ -34,6 +34,10 @@ class Chat(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        Index('ix_chats_user_id_created_at', user_id, created_at.desc()),
+    )
+
     user: Mapped["User"] = relationship("User", back_populates="chats")
     messages: Mapped[List["Message"]] = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
 
@@ -45,11 +49,19 @@ class Message(Base):
 
     prompt = Column(String, nullable=False)
     response = Column(String, nullable=True)
+    # The response split into text and code once, when it is written
+    message = Column(String, nullable=True)
+    code = Column(String, nullable=True)
+    code_hash = Column(String(64), nullable=True, index=True)
     video_id = Column(String, ForeignKey('videos.id'), nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        Index('ix_messages_chat_id_created_at', chat_id, created_at),
+    )
+
     chat: Mapped["Chat"] = relationship("Chat", back_populates="messages")
     video: Mapped["Video"] = relationship("Video", back_populates="message")
 
@@ -73,19 +85,43 @@ class Credits(Base):
     refreshed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now(), nullable=False)
 
-    async def get_current_credits(self, db: AsyncSession) -> int:
-        if self.refreshed_at and datetime.now(timezone.utc) - self.refreshed_at >= timedelta(hours=24):
-            self.amount = 500
-            self.refreshed_at = datetime.now(timezone.utc)
-            await db.commit()
-        
-        return self.amount
-    
-    async def deduct_credits(self, db: AsyncSession, cost: int):
-        current_credits = await self.get_current_credits(db)
-        if current_credits == 0:
-            raise ValueError("Insufficient credits")
-
-        self.amount = max(current_credits - cost, 0)
-
-        await db.commit()
\ No newline at end of file
+    DAILY_AMOUNT = 500
+    REFRESH_INTERVAL = timedelta(hours=24)
+
+    @classmethod
+    async def current(cls, db: AsyncSession, user_id: str) -> Optional[Tuple[int, datetime]]:
+        """(amount, refreshed_at) for the user, applying the daily refresh if it is due. Commits."""
+        result = await db.execute(
+            update(cls)
+            .where(cls.user_id == user_id, cls.refreshed_at <= func.now() - cls.REFRESH_INTERVAL)
+            .values(amount=cls.DAILY_AMOUNT, refreshed_at=func.now())
+            .returning(cls.amount, cls.refreshed_at)
+        )
+        row = result.one_or_none()
+        await db.commit()
+
+        if row is None:
+            result = await db.execute(select(cls.amount, cls.refreshed_at).where(cls.user_id == user_id))
+            row = result.one_or_none()
+
+        return tuple(row) if row else None
+
+    @classmethod
+    async def deduct(cls, db: AsyncSession, user_id: str, cost: int) -> Optional[Tuple[int, datetime]]:
+        """Refreshes if due and takes `cost` off, floored at 0, in one UPDATE. Returns the new
+        (amount, refreshed_at), or None if the user has no credits left. The caller commits."""
+        refresh_due = cls.refreshed_at <= func.now() - cls.REFRESH_INTERVAL
+        balance = case((refresh_due, cls.DAILY_AMOUNT), else_=cls.amount)
+
+        result = await db.execute(
+            update(cls)
+            .where(cls.user_id == user_id, or_(refresh_due, cls.amount > 0))
+            .values(
+                amount=func.greatest(balance - cost, 0),
+                refreshed_at=case((refresh_due, func.now()), else_=cls.refreshed_at),
+            )
+            .returning(cls.amount, cls.refreshed_at)
+        )
+        row = result.one_or_none()
+
+        return tuple(row) if row else None
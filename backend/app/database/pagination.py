@@ -0,0 +1,23 @@
+import base64
+from datetime import datetime
+import json
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """Opaque keyset cursor for the row a page ended on."""
+    payload = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    if not cursor:
+        return None
+
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
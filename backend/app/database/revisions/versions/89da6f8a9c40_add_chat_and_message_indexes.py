@@ -0,0 +1,39 @@
+"""add chat and message indexes
+
+Revision ID: 89da6f8a9c40
+Revises: e72432c6fab0
+Create Date: 2026-10-18 10:12:44.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '89da6f8a9c40'
+down_revision: Union[str, Sequence[str], None] = 'e72432c6fab0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run in a transaction, but keeps the tables writable while the indexes build
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chats_user_id_created_at', 'chats', ['user_id', sa.text('created_at DESC')],
+            unique=False, postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_messages_chat_id_created_at', 'messages', ['chat_id', 'created_at'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_messages_chat_id_created_at', table_name='messages', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_chats_user_id_created_at', table_name='chats', postgresql_concurrently=True, if_exists=True)
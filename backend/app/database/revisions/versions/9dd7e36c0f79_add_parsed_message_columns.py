@@ -0,0 +1,89 @@
+"""add parsed message columns
+
+Revision ID: 9dd7e36c0f79
+Revises: 89da6f8a9c40
+Create Date: 2026-10-18 11:03:27.905113
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9dd7e36c0f79'
+down_revision: Union[str, Sequence[str], None] = '89da6f8a9c40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+messages = sa.table(
+    'messages',
+    sa.column('id', sa.String),
+    sa.column('response', sa.String),
+    sa.column('message', sa.String),
+    sa.column('code', sa.String),
+    sa.column('code_hash', sa.String),
+)
+
+
+def parse(response: str) -> dict:
+    # Same as simple_parser and code_hash in app.chat.llm.parser, copied so the migration doesn't change with the app
+    parts = response.split("```", 2)
+    code = parts[1].strip() if len(parts) > 1 else ""
+
+    # The hash leaves out the fence's language tag, everything up to the first newline
+    tag, newline, body = parts[1].partition("\n") if len(parts) > 1 else ("", "", "")
+    hashed = (body if newline else tag).strip()
+
+    return {
+        'message': parts[0].strip(),
+        'code': code,
+        'code_hash': hashlib.sha256(hashed.encode()).hexdigest() if hashed else None,
+    }
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('messages', sa.Column('message', sa.String(), nullable=True))
+    op.add_column('messages', sa.Column('code', sa.String(), nullable=True))
+    op.add_column('messages', sa.Column('code_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_messages_code_hash'), 'messages', ['code_hash'], unique=False)
+
+    # Backfill in keyset batches, so large tables don't load into memory at once
+    connection = op.get_bind()
+    last_id = ''
+
+    while True:
+        rows = connection.execute(
+            sa.select(messages.c.id, messages.c.response)
+            .where(messages.c.id > last_id, messages.c.response.is_not(None))
+            .order_by(messages.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+
+        if not rows:
+            break
+
+        connection.execute(
+            messages.update()
+            .where(messages.c.id == sa.bindparam('b_id'))
+            .values(
+                message=sa.bindparam('message'),
+                code=sa.bindparam('code'),
+                code_hash=sa.bindparam('code_hash'),
+            ),
+            [{'b_id': row.id, **parse(row.response)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_messages_code_hash'), table_name='messages')
+    op.drop_column('messages', 'code_hash')
+    op.drop_column('messages', 'code')
+    op.drop_column('messages', 'message')
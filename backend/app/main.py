@@ -1,16 +1,25 @@
 import asyncio
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import config, check_config
 
-from app.chat.route import router as chat_router
+from app.chat.route import router as chat_router, task_manager
+from app.chat.llm.validator import installed_exports
 
 check_config()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warms the render workers and the validator's manim symbol table before the first task arrives
+    await task_manager.start_queue_processor()
+    await asyncio.to_thread(installed_exports)
+    yield
+    await task_manager.close()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [config['FRONTEND_URL']]
 app.add_middleware(
@@ -19,21 +28,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(chat_router, prefix="/api")
 
-async def event_stream():
-    counter = 0
-    while True:
-        yield f"data: {counter}\n\n"
-        counter += 1
-        await asyncio.sleep(1)  # simulate new data every second
-    
-@app.get("/stream")
-async def stream():
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
-
 @app.get("/health")
 async def health_check():
     return {
@@ -42,3 +41,7 @@ async def health_check():
         "frontend_url": config['FRONTEND_URL'],
         "random_var": config.get('RANDOM_VAR', 'not set')
     }
+
+@app.get("/health/render")
+async def render_health():
+    return task_manager.get_system_stats()
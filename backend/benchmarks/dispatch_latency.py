@@ -0,0 +1,103 @@
+"""Enqueue-to-start latency of the render queue at different queue depths.
+
+Drives RedisTaskManager against a real Redis with the render replaced by a sleep,
+so the numbers only contain queueing and dispatch overhead. Run from backend/:
+
+    python -m benchmarks.dispatch_latency --redis-url redis://localhost:6379/15 --depths 1,10,50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.harness import bench_dirs, percentile, prefix_keys  # Before app.*, it sets placeholder settings
+from app.chat.task_processing import RedisTaskManager
+
+
+class BenchTaskManager(RedisTaskManager):
+    """Task manager whose renders just sleep, with its keys under a throwaway prefix."""
+
+    def __init__(self, redis_url: str, max_workers: int, render_seconds: float):
+        super().__init__(redis_url, max_workers=max_workers)
+
+        self.prefix = prefix_keys(self)
+
+        self.render_seconds = render_seconds
+        self.latencies: list[float] = []
+        self.starts: list[float] = []
+        self.finishes: list[float] = []
+        self.expected = 0
+        self.finished = asyncio.Event()
+
+    async def _process_single_task(self, task_id: str) -> None:
+        started_at = time.time()
+        created_at = float(await self.redis.hget(self.TASK_KEY.format(task_id=task_id), "created_at"))
+
+        self.latencies.append(started_at - created_at)
+        self.starts.append(started_at)
+
+        await asyncio.sleep(self.render_seconds)
+
+        self.finishes.append(time.time())
+        if len(self.finishes) >= self.expected:
+            self.finished.set()
+
+    async def cleanup(self) -> None:
+        async for key in self.redis.scan_iter(match=self.prefix + "*"):
+            await self.redis.delete(key)
+
+
+def dispatch_gaps(starts: list[float], finishes: list[float], workers: int) -> list[float]:
+    """Time between a slot freeing up and the next queued task starting on it."""
+    gaps = []
+    for start in sorted(starts)[workers:]:
+        freed = [finish for finish in finishes if finish <= start]
+        if freed:
+            gaps.append(start - max(freed))
+    return gaps
+
+
+async def run_depth(redis_url: str, depth: int, workers: int, render_seconds: float) -> dict:
+    with bench_dirs():
+        manager = BenchTaskManager(redis_url, max_workers=workers, render_seconds=render_seconds)
+        manager.expected = depth
+
+        try:
+            for i in range(depth):
+                await manager.submit_task(user_id=f"bench-user-{i}", chat_id="bench", message_id=str(i), manim_code="")
+
+            await asyncio.wait_for(manager.finished.wait(), timeout=depth * render_seconds + 60)
+        finally:
+            await manager.stop_queue_processor()
+            await manager.cleanup()
+            await manager.redis.aclose()
+
+    gaps = dispatch_gaps(manager.starts, manager.finishes, workers)
+
+    return {
+        "depth": depth,
+        "p50_ms": percentile(manager.latencies, 0.5) * 1000,
+        "p95_ms": percentile(manager.latencies, 0.95) * 1000,
+        "max_ms": max(manager.latencies) * 1000,
+        "dispatch_gap_ms": statistics.mean(gaps) * 1000 if gaps else 0.0,
+    }
+
+
+async def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--redis-url", default=os.environ["REDIS_URL"])
+    arg_parser.add_argument("--depths", default="1,10,50", help="comma separated queue depths")
+    arg_parser.add_argument("--workers", type=int, default=4)
+    arg_parser.add_argument("--render-seconds", type=float, default=0.2)
+    args = arg_parser.parse_args()
+
+    print(f"{'depth':>6} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10} {'gap ms':>10}")
+
+    for depth in (int(d) for d in args.depths.split(",")):
+        row = await run_depth(args.redis_url, depth, args.workers, args.render_seconds)
+        print(f"{row['depth']:>6} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f} {row['max_ms']:>10.1f} {row['dispatch_gap_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
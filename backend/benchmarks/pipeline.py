@@ -0,0 +1,240 @@
+"""End-to-end throughput of the render pipeline: queue, warm-worker render, S3 upload.
+
+Submits the scenes in benchmarks/scenes/ (round-robin, one user per task) to a
+RedisTaskManager with real renders, and reports enqueue-to-start latency, render
+time, upload time and tasks per minute. The LLM and the database are left out.
+
+Runs offline with fakeredis and an in-process moto S3 server. Run from backend/:
+
+    pip install "fakeredis[lua]" "moto[server]"
+    python -m benchmarks.pipeline --tasks 20 --workers 4
+
+or against real services:
+
+    python -m benchmarks.pipeline --redis-url redis://localhost:6379/15 --s3-endpoint-url http://localhost:9000
+
+To gate regressions, save a run with --output and compare later runs against it:
+
+    python -m benchmarks.pipeline --output baseline.json
+    python -m benchmarks.pipeline --baseline baseline.json --max-regression 0.15
+"""
+import argparse
+import asyncio
+import json
+from pathlib import Path
+import socket
+import sys
+import time
+from typing import Optional, Tuple
+
+from benchmarks.harness import bench_dirs, ensure_bucket, percentile, prefix_keys  # Before app.*, it sets placeholder settings
+from app.chat.storage import S3Storage
+from app.config import config
+from app.chat.task_processing import RedisTaskManager, TaskStatus
+
+
+SCENES_DIR = Path(__file__).with_name("scenes")
+
+
+class PipelineBenchManager(RedisTaskManager):
+    """The real task manager, minus the database, with renders timed per task."""
+
+    def __init__(self, args: argparse.Namespace, redis_client):
+        super().__init__(args.redis_url, max_workers=args.workers, redis_client=redis_client)
+
+        self.prefix = prefix_keys(self)
+        self.storage = S3Storage(
+            region="us-east-1",
+            aws_access_key_id=args.access_key,
+            aws_secret_access_key=args.secret_key,
+            endpoint_url=args.s3_endpoint_url,
+        )
+
+        if not args.render_cache:
+            self.render_cache.key_for = lambda manim_code, render_config=None: None
+
+        self.render_seconds: dict[str, float] = {}
+
+    async def run_manim_generation(self, task_id: str, manim_code: str, output_dir: str, render_config: Optional[dict] = None) -> Tuple[bool, str]:
+        started_at = time.perf_counter()
+        result = await super().run_manim_generation(task_id, manim_code, output_dir, render_config)
+        self.render_seconds[task_id] = self.render_seconds.get(task_id, 0) + time.perf_counter() - started_at
+        return result
+
+    async def add_video_to_db(self, chat_id: str, message_id: str, user_id: str, s3_bucket: str, s3_key: str):
+        pass
+
+    async def cleanup(self) -> None:
+        async for key in self.redis.scan_iter(match=self.prefix + "*"):
+            await self.redis.delete(key)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_tasks(manager: RedisTaskManager, task_ids: list[str], timeout: float) -> dict[str, dict]:
+    deadline = time.monotonic() + timeout
+    statuses: dict[str, dict] = {}
+
+    while len(statuses) < len(task_ids):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Only {len(statuses)} of {len(task_ids)} tasks finished in {timeout}s")
+
+        for task_id in task_ids:
+            if task_id in statuses:
+                continue
+
+            task = await manager.get_task_status(task_id)
+            if task and task["status"] in (TaskStatus.COMPLETED.value, TaskStatus.FAILED.value):
+                statuses[task_id] = task
+
+        await asyncio.sleep(0.2)
+
+    return statuses
+
+
+def summarize(manager: PipelineBenchManager, statuses: dict[str, dict], upload_seconds: dict[str, float], workers: int) -> dict:
+    tasks = list(statuses.values())
+    completed = [task for task in tasks if task["status"] == TaskStatus.COMPLETED.value]
+
+    latencies = [task["started_at"] - task["created_at"] for task in tasks if "started_at" in task]
+    renders = [manager.render_seconds[task_id] for task_id in statuses if task_id in manager.render_seconds]
+    uploads = list(upload_seconds.values())
+
+    elapsed = max(task["completed_at"] for task in tasks) - min(task["created_at"] for task in tasks)
+
+    return {
+        "workers": workers,
+        "tasks": len(tasks),
+        "failed": len(tasks) - len(completed),
+        "tasks_per_minute": len(completed) / elapsed * 60 if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "render_p50": percentile(renders, 0.5),
+        "render_p95": percentile(renders, 0.95),
+        "upload_p50": percentile(uploads, 0.5),
+        "upload_p95": percentile(uploads, 0.95),
+    }
+
+
+def regressions(result: dict, baseline: dict, max_regression: float) -> list[str]:
+    problems = []
+
+    if result["tasks_per_minute"] < baseline["tasks_per_minute"] * (1 - max_regression):
+        problems.append(f"tasks_per_minute {result['tasks_per_minute']:.2f} < baseline {baseline['tasks_per_minute']:.2f}")
+
+    for metric in ("latency_p95", "render_p95", "upload_p95"):
+        # Ignore noise on stages that take next to no time
+        if result[metric] > baseline[metric] * (1 + max_regression) and result[metric] - baseline[metric] > 0.05:
+            problems.append(f"{metric} {result[metric]:.3f}s > baseline {baseline[metric]:.3f}s")
+
+    if result["failed"] > baseline["failed"]:
+        problems.append(f"{result['failed']} failed tasks, baseline had {baseline['failed']}")
+
+    return problems
+
+
+async def run(args: argparse.Namespace) -> dict:
+    moto_server = None
+    redis_client = None
+
+    if not args.s3_endpoint_url:
+        from moto.server import ThreadedMotoServer
+
+        port = free_port()
+        moto_server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+        moto_server.start()
+        args.s3_endpoint_url = f"http://127.0.0.1:{port}"
+
+    if not args.redis_url:
+        import fakeredis
+
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    scenes = sorted(SCENES_DIR.glob("*.py"))
+    codes = [scene.read_text() for scene in scenes]
+
+    with bench_dirs():
+        manager = PipelineBenchManager(args, redis_client)
+
+        try:
+            # The manager uploads to AWS_S3_BUCKET
+            await ensure_bucket(manager.storage, config['AWS_S3_BUCKET'])
+
+            # Warm workers first, so the numbers are steady state rather than the manim import
+            await manager.start_queue_processor()
+
+            task_ids = [
+                await manager.submit_task(
+                    user_id=f"bench-user-{i}",
+                    chat_id="bench",
+                    message_id=f"bench-{i}",
+                    manim_code=codes[i % len(codes)],
+                )
+                for i in range(args.tasks)
+            ]
+
+            statuses = await wait_for_tasks(manager, task_ids, timeout=args.timeout)
+
+            upload_seconds = {}
+            for task_id in task_ids:
+                seconds = await manager.redis.hget(manager.TASK_KEY.format(task_id=task_id), "upload_seconds")
+                if seconds:
+                    upload_seconds[task_id] = float(seconds)
+
+            for task_id, task in statuses.items():
+                if task["status"] == TaskStatus.FAILED.value:
+                    print(f"Task {task_id} failed: {task.get('error', '')[-500:]}", file=sys.stderr)
+
+            return summarize(manager, statuses, upload_seconds, args.workers)
+        finally:
+            await manager.stop_queue_processor()
+            await manager.cleanup()
+            await manager.storage.close()
+            await manager.redis.aclose()
+
+            if moto_server:
+                moto_server.stop()
+
+
+async def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--redis-url", default="", help="real Redis instead of fakeredis")
+    arg_parser.add_argument("--s3-endpoint-url", default="", help="S3 compatible endpoint instead of an in-process moto server")
+    arg_parser.add_argument("--access-key", default="bench")
+    arg_parser.add_argument("--secret-key", default="bench")
+    arg_parser.add_argument("--tasks", type=int, default=20)
+    arg_parser.add_argument("--workers", type=int, default=4)
+    arg_parser.add_argument("--timeout", type=float, default=60 * 30)
+    arg_parser.add_argument("--render-cache", action="store_true", help="let repeated scenes hit the render cache")
+    arg_parser.add_argument("--output", help="write the results as JSON")
+    arg_parser.add_argument("--baseline", help="JSON results to compare against, exits 1 on a regression")
+    arg_parser.add_argument("--max-regression", type=float, default=0.15)
+    args = arg_parser.parse_args()
+
+    result = await run(args)
+
+    print(f"{'workers':>8} {'tasks':>6} {'failed':>7} {'tasks/min':>10} {'start p50/p95 s':>16} {'render p50/p95 s':>17} {'upload p50/p95 s':>17}")
+    print(
+        f"{result['workers']:>8} {result['tasks']:>6} {result['failed']:>7} {result['tasks_per_minute']:>10.2f} "
+        f"{result['latency_p50']:>7.2f}/{result['latency_p95']:<8.2f} "
+        f"{result['render_p50']:>8.2f}/{result['render_p95']:<8.2f} "
+        f"{result['upload_p50']:>8.2f}/{result['upload_p95']:<8.2f}"
+    )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+
+    if args.baseline:
+        problems = regressions(result, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        for problem in problems:
+            print(f"Regression: {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
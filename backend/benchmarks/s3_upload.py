@@ -0,0 +1,92 @@
+"""Upload throughput of rendered videos: per-call session vs the shared, tuned S3Storage client.
+
+Needs an S3 compatible endpoint, e.g. MinIO or `moto_server`. Run from backend/:
+
+    docker run -p 9000:9000 minio/minio server /data
+    python -m benchmarks.s3_upload --endpoint-url http://localhost:9000 --sizes 50,100,200
+
+Files are random bytes, which upload like already-compressed 1080p60 mp4s.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import aioboto3
+
+from benchmarks.harness import ensure_bucket
+from app.chat.storage import S3Storage
+
+
+async def baseline_upload(args: argparse.Namespace, file_path: str, s3_key: str) -> float:
+    """What upload_video_to_s3 used to do: a new Session + client and default transfer settings."""
+    session = aioboto3.Session(aws_access_key_id=args.access_key, aws_secret_access_key=args.secret_key)
+    started_at = time.perf_counter()
+
+    async with session.client("s3", region_name=args.region, endpoint_url=args.endpoint_url) as s3_client:
+        with open(file_path, "rb") as data:
+            await s3_client.upload_fileobj(data, args.bucket, s3_key)
+
+    return time.perf_counter() - started_at
+
+
+def make_file(directory: str, size_mb: int) -> str:
+    file_path = os.path.join(directory, f"{size_mb}mb.mp4")
+    with open(file_path, "wb") as file:
+        for _ in range(size_mb):
+            file.write(os.urandom(1024 * 1024))
+    return file_path
+
+
+async def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--endpoint-url", default="http://localhost:9000")
+    arg_parser.add_argument("--bucket", default="anim-bench")
+    arg_parser.add_argument("--region", default="us-east-1")
+    arg_parser.add_argument("--access-key", default="minioadmin")
+    arg_parser.add_argument("--secret-key", default="minioadmin")
+    arg_parser.add_argument("--sizes", default="50,100,200", help="comma separated file sizes in MB")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--chunk-mb", type=int, default=16)
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    args = arg_parser.parse_args()
+
+    storage = S3Storage(
+        region=args.region,
+        aws_access_key_id=args.access_key,
+        aws_secret_access_key=args.secret_key,
+        endpoint_url=args.endpoint_url,
+        multipart_threshold=args.chunk_mb * 1024 * 1024,
+        multipart_chunksize=args.chunk_mb * 1024 * 1024,
+        max_concurrency=args.concurrency,
+    )
+
+    try:
+        await ensure_bucket(storage, args.bucket)
+
+        print(f"{'size MB':>8} {'baseline MB/s':>14} {'tuned MB/s':>12} {'speedup':>8}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            for size_mb in (int(size) for size in args.sizes.split(",")):
+                file_path = make_file(directory, size_mb)
+                baseline, tuned = [], []
+
+                for i in range(args.repeat):
+                    baseline.append(await baseline_upload(args, file_path, f"bench/baseline/{size_mb}-{i}.mp4"))
+
+                    metrics = await storage.upload_file(file_path, args.bucket, f"bench/tuned/{size_mb}-{i}.mp4")
+                    tuned.append(metrics["upload_seconds"])
+
+                baseline_rate = size_mb / statistics.median(baseline)
+                tuned_rate = size_mb / statistics.median(tuned)
+                print(f"{size_mb:>8} {baseline_rate:>14.1f} {tuned_rate:>12.1f} {tuned_rate / baseline_rate:>7.2f}x")
+
+                os.remove(file_path)
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,21 @@
+from manim import *
+
+
+class MathScene(Scene):
+    def construct(self):
+        pythagoras = MathTex(r"a^2 + b^2 = c^2")
+        euler = MathTex(r"e^{i\pi} + 1 = 0")
+        integral = MathTex(r"\int_0^\infty e^{-x^2}\,dx = \frac{\sqrt{\pi}}{2}")
+        series = MathTex(r"\sum_{n=1}^{\infty} \frac{1}{n^2} = \frac{\pi^2}{6}")
+
+        self.play(Write(pythagoras))
+        self.wait(0.5)
+        for formula in (euler, integral, series):
+            self.play(TransformMatchingTex(pythagoras, formula))
+            pythagoras = formula
+            self.wait(0.5)
+
+
+if __name__ == "__main__":
+    scene = MathScene()
+    scene.render()
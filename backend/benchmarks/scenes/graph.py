@@ -0,0 +1,22 @@
+from manim import *
+
+
+class GraphScene(Scene):
+    def construct(self):
+        axes = Axes(x_range=[-3, 3, 1], y_range=[-1, 9, 2], x_length=8, y_length=5).add_coordinates()
+        parabola = axes.plot(lambda x: x ** 2, color=BLUE)
+        label = axes.get_graph_label(parabola, label="x^2")
+
+        tracker = ValueTracker(-2.5)
+        dot = always_redraw(lambda: Dot(axes.c2p(tracker.get_value(), tracker.get_value() ** 2), color=YELLOW))
+
+        self.play(Create(axes))
+        self.play(Create(parabola), Write(label))
+        self.add(dot)
+        self.play(tracker.animate.set_value(2.5), run_time=3)
+        self.wait(0.5)
+
+
+if __name__ == "__main__":
+    scene = GraphScene()
+    scene.render()
@@ -0,0 +1,22 @@
+from manim import *
+
+
+class SectionsScene(Scene):
+    def construct(self):
+        square = Square(color=BLUE)
+        self.play(Create(square))
+
+        self.next_section("rotate")
+        self.play(Rotate(square, PI), run_time=2)
+
+        self.next_section("morph")
+        circle = Circle(color=GREEN)
+        self.play(Transform(square, circle), run_time=2)
+
+        self.next_section("outro")
+        self.play(FadeOut(square))
+
+
+if __name__ == "__main__":
+    scene = SectionsScene()
+    scene.render()
@@ -0,0 +1,19 @@
+from manim import *
+
+
+class ShapesScene(Scene):
+    def construct(self):
+        circle = Circle(color=BLUE).shift(LEFT * 3)
+        square = Square(color=GREEN)
+        triangle = Triangle(color=RED).shift(RIGHT * 3)
+
+        self.play(Create(circle), Create(square), Create(triangle))
+        self.play(circle.animate.scale(1.5), square.animate.rotate(PI / 4), triangle.animate.set_fill(RED, opacity=0.5))
+        self.play(Transform(square, Circle(color=YELLOW)))
+        self.wait(0.5)
+        self.play(FadeOut(circle, square, triangle))
+
+
+if __name__ == "__main__":
+    scene = ShapesScene()
+    scene.render()
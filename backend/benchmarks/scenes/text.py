@@ -0,0 +1,22 @@
+from manim import *
+
+
+class TextScene(Scene):
+    def construct(self):
+        title = Text("Binary Search", font_size=56)
+        steps = VGroup(
+            Text("1. Look at the middle element", font_size=32),
+            Text("2. Discard the half that can't contain the target", font_size=32),
+            Text("3. Repeat until found", font_size=32),
+        ).arrange(DOWN, aligned_edge=LEFT).next_to(title, DOWN, buff=0.8)
+
+        self.play(Write(title))
+        self.play(title.animate.to_edge(UP))
+        for step in steps:
+            self.play(FadeIn(step, shift=RIGHT))
+        self.wait(1)
+
+
+if __name__ == "__main__":
+    scene = TextScene()
+    scene.render()
@@ -32,15 +32,16 @@ import { Spinner } from "@/components/ui/shadcn-io/spinner";
 import { AnimatePresence, motion } from "motion/react";
 import { useParams } from "next/navigation";
 import { compressTitle } from "@/lib/utils";
-import { useRef } from "react";
+import { useRef, useState } from "react";
 import { Button } from "@/components/ui/button";
+import useApi from "@/hooks/useApi";
 
 interface Props {
   fetchingHistory: boolean;
 }
 
 const History: React.FC<Props> = ({ fetchingHistory }) => {
-  const { history } = useHistoryStore();
+  const { history, nextCursor, appendHistory } = useHistoryStore();
   const { user } = useUser();
   const params = useParams();
 
@@ -51,6 +52,22 @@ const History: React.FC<Props> = ({ fetchingHistory }) => {
 
   const triggerRef = useRef<HTMLButtonElement>(null);
 
+  const { getHistory } = useApi();
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const { items, nextCursor: cursor } = await getHistory(nextCursor);
+      appendHistory(items, cursor);
+    } catch (error) {
+      console.error("Error fetching chat history:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <Sidebar>
       <SidebarHeader className="bg-[#0A0A0A] ">
@@ -129,6 +146,17 @@ const History: React.FC<Props> = ({ fetchingHistory }) => {
                     )}
                 </div>
               </AnimatePresence>
+              {!fetchingHistory && nextCursor && (
+                <Button
+                  variant="ghost"
+                  size="sm"
+                  className="w-full text-gray-500"
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                >
+                  {loadingMore ? <Spinner size={16} /> : "Load more"}
+                </Button>
+              )}
             </SidebarMenu>
           </SidebarGroupContent>
         </SidebarGroup>
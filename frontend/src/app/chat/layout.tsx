@@ -45,8 +45,10 @@ export default function Layout({children}: {children: React.ReactNode}) {
       try {
         setFetchingHistory(true);
         // await sleep(10 * 2000);
-        const history  = await getHistory();
-        useHistoryStore.getState().setHistory(history);
+        const { items, nextCursor } = await getHistory();
+        const { setHistory, setNextCursor } = useHistoryStore.getState();
+        setHistory(items);
+        setNextCursor(nextCursor);
       } catch (error) {
         console.error("Error fetching chat history:", error);
       }
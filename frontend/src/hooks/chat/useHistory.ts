@@ -17,7 +17,7 @@ interface UseHistory {
 const useHistory = ({ chatId, onVideoReceived, onGenerationError, cleanup, responseState, setResponseState }: UseHistory) => {
     const { getMessagesById, getStatus } = useApi();
     const { startGeneration, chatWorkflowRunning } = useChatStore.getState();
-    const { runStatusPollsForVideoGeneration } = useVideoGeneration({ onVideoReceived, cleanup, onGenerationError });
+    const { runStatusUpdatesForVideoGeneration } = useVideoGeneration({ onVideoReceived, cleanup, onGenerationError });
 
     // used to stop the queryFn from running if the component mounted
     // with startGeneration = True
@@ -51,7 +51,7 @@ const useHistory = ({ chatId, onVideoReceived, onGenerationError, cleanup, respo
             if(status && (status.status === "processing" || status.status === "queued")) {
                 if (status.chat_id === chatId) {
                     setResponseState("generating");
-                    runStatusPollsForVideoGeneration();
+                    runStatusUpdatesForVideoGeneration();
                 }
             }
         }
@@ -4,6 +4,26 @@ import useChatStore from "@/store/useChatStore";
 import type { messageState } from "@/lib/types";
 
 
+// <failed/>, or <failed>{"errors": [...]}</failed> when the server says why
+const FAILED_FRAME = /^<failed>([\s\S]*)<\/failed>$/;
+
+function getFailureMessage(message: string): string | null {
+    if (message === "<failed/>") return "Video generation failed";
+
+    const match = message.match(FAILED_FRAME);
+    if (!match) return null;
+
+    try {
+        const { errors } = JSON.parse(match[1]) as { errors?: string[] };
+        if (errors && errors.length > 0) {
+            return `Video generation failed: ${errors.join("; ")}`;
+        }
+    } catch (error) {
+        console.error("Malformed failure message:", error);
+    }
+    return "Video generation failed";
+}
+
 interface ResponseStateOptions {
     onGenerationError: (errMsg: string) => void;
     onVideoReceived: () => void;
@@ -19,7 +39,7 @@ const useResponseState = ({ onGenerationError, onVideoReceived }: ResponseStateO
         writingCodeRef.current = false;
     }, [])
 
-    const { runStatusPollsForVideoGeneration } = useVideoGeneration({ 
+    const { runStatusUpdatesForVideoGeneration } = useVideoGeneration({ 
         onVideoReceived,
         cleanup,
         onGenerationError
@@ -30,6 +50,13 @@ const useResponseState = ({ onGenerationError, onVideoReceived }: ResponseStateO
             setResponseState("writing");
         }
         
+        const failureMessage = getFailureMessage(message);
+        if (failureMessage) {
+            cleanup();
+            onGenerationError(failureMessage);
+            return false;
+        }
+
         if(message.includes("```")) {
             setResponseState("coding");
         }
@@ -37,20 +64,15 @@ const useResponseState = ({ onGenerationError, onVideoReceived }: ResponseStateO
             setResponseState(null);
             return false;
         }
-        else if (message === "<failed/>") {
-            cleanup();
-            onGenerationError("Video generation failed");
-            return false;
-        }
         else if (message === "<queued/>") {
             // poll for status updates
             setResponseState("generating");
-            runStatusPollsForVideoGeneration();
+            runStatusUpdatesForVideoGeneration();
             return false;
         }
 
         return true;
-    }, [responseState, onGenerationError, onVideoReceived, cleanup, runStatusPollsForVideoGeneration]);
+    }, [responseState, onGenerationError, onVideoReceived, cleanup, runStatusUpdatesForVideoGeneration]);
 
     return { 
         responseState, 
@@ -1,4 +1,6 @@
 import useApi from '@/hooks/useApi';
+import useChatStore from '@/store/useChatStore';
+import { useAuth } from '@clerk/nextjs';
 
 interface VideoGenerationOptions {
     onVideoReceived: () => void;
@@ -7,7 +9,17 @@ interface VideoGenerationOptions {
 }
 const useVideoGeneration = ({onVideoReceived, cleanup, onGenerationError}: VideoGenerationOptions) => {
     const { getStatus } = useApi();
-    const runStatusPollsForVideoGeneration = () => {
+    const { getToken } = useAuth();
+
+    // With previews on, the task goes back to the queue with a low quality video
+    // to show until the full render replaces it
+    const showPreview = (statusInfo: { preview_url?: string } | null) => {
+        if (statusInfo?.preview_url) {
+            useChatStore.getState().setLastMessageVideoUrl(statusInfo.preview_url);
+        }
+    }
+
+    const runStatusPolls = () => {
         let intervalId: NodeJS.Timeout | undefined = undefined;
         intervalId = setInterval(async () => {
             const statusInfo = await getStatus();
@@ -18,12 +30,51 @@ const useVideoGeneration = ({onVideoReceived, cleanup, onGenerationError}: Video
                 onVideoReceived();
             }
             else if(statusInfo.status === "failed") {
+                clearInterval(intervalId);
                 cleanup();
                 onGenerationError("Video generation failed");
             }
+            else {
+                showPreview(statusInfo);
+            }
         }, 3 * 1000);
     }
-    return { runStatusPollsForVideoGeneration };
+
+    // The backend pushes status transitions over SSE, polling is only a fallback
+    const runStatusUpdatesForVideoGeneration = async () => {
+        const token = await getToken();
+        const source = new EventSource(`${process.env.NEXT_PUBLIC_API_URL}/chat/running/stream?token=${token}`);
+        let settled = false;
+
+        source.onmessage = (event) => {
+            const statusInfo = JSON.parse(event.data);
+            if (!statusInfo || statusInfo.status === "completed") {
+                settled = true;
+                source.close();
+                cleanup();
+
+                onVideoReceived();
+            }
+            else if(statusInfo.status === "failed") {
+                settled = true;
+                source.close();
+                cleanup();
+                onGenerationError("Video generation failed");
+            }
+            else {
+                showPreview(statusInfo);
+            }
+        }
+
+        source.onerror = () => {
+            source.close();
+            if (!settled) {
+                runStatusPolls();
+            }
+        }
+    }
+
+    return { runStatusUpdatesForVideoGeneration };
 }
 
-export default useVideoGeneration;
\ No newline at end of file
+export default useVideoGeneration;
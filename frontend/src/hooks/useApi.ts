@@ -16,6 +16,7 @@ interface StatusResponse {
     completed_at?: number,
     result?: string,
     error?: string,
+    preview_url?: string,
 }
 
 interface MessageResponse extends Omit<Message, 'videoUrl'> {
@@ -36,20 +37,28 @@ const useApi = () => {
     }
     async function getMessagesById(id: string) {
         const axiosInstance = await getAxiosInstance();
-        const response = await axiosInstance.get(`/chat/messages/${id}`);
-        const messages: Message[] = response.data.map((msg: MessageResponse) => ({
-            id: msg.id,
-            prompt: msg.prompt,
-            response: msg.response,
-            videoUrl: msg.video_url,
-        }));
+        const messages: Message[] = [];
+        let cursor: string | undefined;
+        do {
+            const response = await axiosInstance.get(`/chat/messages/${id}`, { params: { cursor } });
+            messages.push(...response.data.map((msg: MessageResponse) => ({
+                id: msg.id,
+                prompt: msg.prompt,
+                response: msg.response,
+                videoUrl: msg.video_url,
+            })));
+            cursor = response.headers["x-next-cursor"];
+        } while (cursor);
         return messages;
     }
 
-    async function getHistory() {
+    async function getHistory(cursor?: string) {
         const axiosInstance = await getAxiosInstance();
-        const response = await axiosInstance.get('/chat/history');
-        return response.data as HistoryItem[];
+        const response = await axiosInstance.get('/chat/history', { params: { cursor } });
+        return {
+            items: response.data as HistoryItem[],
+            nextCursor: (response.headers["x-next-cursor"] as string | undefined) ?? null,
+        };
     }
 
     async function getStatus() {
@@ -15,6 +15,7 @@ interface StatusResponse {
     completed_at?: number,
     result?: string,
     error?: string,
+    preview_url?: string,
 }
 
 export const axiosInstance = axios.create({
@@ -27,19 +28,27 @@ interface MessageResponse extends Omit<Message, 'videoUrl'> {
 }
 
 export async function getMessagesById(id: string) {
-    const response = await axiosInstance.get(`/chat/messages/${id}`);
-    const messages: Message[] = response.data.map((msg: MessageResponse) => ({
-        id: msg.id,
-        prompt: msg.prompt,
-        response: msg.response,
-        videoUrl: msg.video_url,
-    }));
+    const messages: Message[] = [];
+    let cursor: string | undefined;
+    do {
+        const response = await axiosInstance.get(`/chat/messages/${id}`, { params: { cursor } });
+        messages.push(...response.data.map((msg: MessageResponse) => ({
+            id: msg.id,
+            prompt: msg.prompt,
+            response: msg.response,
+            videoUrl: msg.video_url,
+        })));
+        cursor = response.headers["x-next-cursor"];
+    } while (cursor);
     return messages;
 }
 
-export async function getHistory() {
-    const response = await axiosInstance.get('/chat/history');
-    return response.data as HistoryItem[];
+export async function getHistory(cursor?: string) {
+    const response = await axiosInstance.get('/chat/history', { params: { cursor } });
+    return {
+        items: response.data as HistoryItem[],
+        nextCursor: (response.headers["x-next-cursor"] as string | undefined) ?? null,
+    };
 }
 
 export async function getStatus() {
@@ -11,6 +11,7 @@ interface ChatStore {
     setChatWorkflowRunning: (chatWorkflowRunning: boolean) => void;
     setGeneratingTitle: (generatingTitle: boolean) => void;
     setMessages: (messages: Message[]) => void;
+    setLastMessageVideoUrl: (videoUrl: string) => void;
 
     prompt: string;
     lastPrompt: string;
@@ -32,6 +33,9 @@ const useChatStore = create<ChatStore>((set, get) => ({
     setTitle: (title) => set({ title }),
     setGeneratingTitle: (generatingTitle) => set({ generatingTitle }),
     setMessages: (messages) => set({ messages }),
+    setLastMessageVideoUrl: (videoUrl) => set(({ messages }) => ({
+        messages: messages.length ? [...messages.slice(0, -1), { ...messages[messages.length - 1], videoUrl }] : messages
+    })),
 
     prompt: '',
     lastPrompt: '',
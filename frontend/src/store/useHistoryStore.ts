@@ -3,10 +3,19 @@ import { create } from "zustand";
 
 interface HistoryStore {
     history: HistoryItem[],
+    nextCursor: string | null,
     setHistory: (history: HistoryItem[]) => void,
+    setNextCursor: (nextCursor: string | null) => void,
+    appendHistory: (history: HistoryItem[], nextCursor: string | null) => void,
 }
 
 export const useHistoryStore = create<HistoryStore>((set) => ({
     history: [],
+    nextCursor: null,
     setHistory: (history) => set({ history }),
-}));
\ No newline at end of file
+    setNextCursor: (nextCursor) => set({ nextCursor }),
+    appendHistory: (history, nextCursor) => set((state) => ({
+        history: [...state.history, ...history.filter((item) => !state.history.some((prev) => prev.id === item.id))],
+        nextCursor,
+    })),
+}));